@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+	Microbenchmarks for the vCard code paths that run inside the API.
+
+	python bench_vcard.py                          # print results
+	python bench_vcard.py --save baseline.json     # record a baseline
+	python bench_vcard.py --compare baseline.json  # exit 1 on regressions
+"""
+import sys
+import json
+import time
+import base64
+import timeit
+import argparse
+import platform
+import tracemalloc
+
+from blobs import extract_media
+from variants import build_variants
+from vcard_builder import VCardBuilder, iter_vcards, normalize_vcard, parse_vcard_into_builder, transcode_vcard
+
+# Defaults of the API's VCARD_MAX_BYTES and BLOB_MIN_BYTES.
+MAX_BYTES = 2 * 1024 * 1024
+BLOB_MIN_BYTES = 4096
+
+
+def synthetic_card(properties: int, photo_bytes: int = 0) -> str:
+	vb = VCardBuilder()
+	vb.add_property("FN", "Benchmark Person")
+	vb.add_property("N", "Person;Benchmark;;;")
+	for i in range(max(properties - 2, 0)):
+		kind = i % 4
+		if kind == 0:
+			vb.add_property("EMAIL", f"user{i}@example.com", {"TYPE": "work"})
+		elif kind == 1:
+			vb.add_property("TEL", f"+6012{i:07d}", {"TYPE": "cell,voice"})
+		elif kind == 2:
+			vb.add_property("X-SOCIALPROFILE", f"https://example.com/u/{i}", {"TYPE": "github"})
+		else:
+			vb.add_property("NOTE", f"Note {i} with an escaped\\, comma and some padding text to fold")
+	if photo_bytes:
+		payload = base64.b64encode(bytes(range(256)) * (photo_bytes // 256 + 1))[:photo_bytes * 4 // 3].decode()
+		vb.add_property("PHOTO", f"data:image/jpeg;base64,{payload}")
+	return vb.render()
+
+
+CARDS = {
+	"tiny": synthetic_card(5),
+	"medium": synthetic_card(50),
+	"large": synthetic_card(500),
+	"photo-100k": synthetic_card(20, 100_000),
+	"photo-1500k": synthetic_card(20, 1_500_000)
+}
+
+
+def write_path(content: str) -> dict:
+	"""What create_card/update_card run per card, minus the database and blob store I/O."""
+	slim, _ = extract_media(normalize_vcard(content, MAX_BYTES), BLOB_MIN_BYTES)
+	return build_variants(slim)
+
+
+def build_builder(content: str) -> VCardBuilder:
+	vb = VCardBuilder()
+	parse_vcard_into_builder(vb, content)
+	return vb
+
+
+def cases():
+	for size, content in CARDS.items():
+		vb = build_builder(content)
+		normalized = normalize_vcard(content, MAX_BYTES)
+		slim, _ = extract_media(normalized, BLOB_MIN_BYTES)
+		yield f"render-cached/{size}", content, lambda vb = vb: vb.render()
+		yield f"render-dirty/{size}", content, lambda vb = vb: (vb.set_property("FN", "Renamed"), vb.render())
+		yield f"parse-builder/{size}", content, lambda content = content: build_builder(content)
+		yield f"iter-vcards/{size}", content, lambda content = content: sum(len(card) for card in iter_vcards(content))
+		yield f"transcode-v3/{size}", content, lambda content = content: transcode_vcard(content, "3.0")
+		yield f"normalize/{size}", content, lambda content = content: normalize_vcard(content, MAX_BYTES)
+		yield f"extract-media/{size}", content, lambda normalized = normalized: extract_media(normalized, BLOB_MIN_BYTES)
+		yield f"variants/{size}", content, lambda slim = slim: build_variants(slim)
+		yield f"write-path/{size}", content, lambda content = content: write_path(content)
+
+
+def measure(func, min_time: float) -> dict:
+	timer = timeit.Timer(func)
+	number, _ = timer.autorange()
+	runs = max(int(number * min_time / 0.2), 1)
+	best = min(timer.repeat(repeat = 3, number = runs)) / runs
+	tracemalloc.start()
+	func()
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return {
+		"seconds": best,
+		"peak_bytes": peak
+	}
+
+
+def run(selected: str | None, min_time: float) -> dict:
+	results = {}
+	for name, content, func in cases():
+		if selected and selected not in name:
+			continue
+		result = measure(func, min_time)
+		result["mb_per_s"] = len(content.encode()) / result["seconds"] / 1e6
+		results[name] = result
+		print(f"{name:28} {result['seconds'] * 1e6:12.2f} µs {result['mb_per_s']:10.1f} MB/s {result['peak_bytes'] / 1024:10.1f} KiB peak")
+	return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+	regressions = []
+	for name, result in results.items():
+		previous = baseline.get("results", {}).get(name)
+		if not previous:
+			continue
+		if result["seconds"] > previous["seconds"] * (1 + tolerance):
+			regressions.append(f"{name}: {previous['seconds'] * 1e6:.2f} µs -> {result['seconds'] * 1e6:.2f} µs")
+		if result["peak_bytes"] > previous["peak_bytes"] * (1 + tolerance) + 1024:
+			regressions.append(f"{name}: peak {previous['peak_bytes']} B -> {result['peak_bytes']} B")
+	return regressions
+
+
+def main(argv: list) -> int:
+	parser = argparse.ArgumentParser(description = "vCard parse/render/validation microbenchmarks")
+	parser.add_argument("-k", dest = "selected", help = "only run cases whose name contains this")
+	parser.add_argument("--min-time", type = float, default = 0.2, help = "approximate seconds per repeat")
+	parser.add_argument("--save", help = "write results to this baseline file")
+	parser.add_argument("--compare", help = "compare against this baseline file")
+	parser.add_argument("--tolerance", type = float, default = 0.25, help = "allowed slowdown before failing")
+	args = parser.parse_args(argv)
+
+	results = run(args.selected, args.min_time)
+	if args.save:
+		with open(args.save, "w", encoding = "utf-8") as f:
+			json.dump(
+				{
+					"python": platform.python_version(),
+					"machine": platform.machine(),
+					"created_at": int(time.time()),
+					"results": results
+				},
+				f,
+				indent = 2
+			)
+	if args.compare:
+		with open(args.compare, encoding = "utf-8") as f:
+			regressions = compare(results, json.load(f), args.tolerance)
+		for regression in regressions:
+			print(f"❌ {regression}", file = sys.stderr)
+		return 1 if regressions else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
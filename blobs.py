@@ -0,0 +1,234 @@
+import os
+import base64
+import asyncio
+import hashlib
+import binascii
+
+from vcard_builder import fold_line, iter_lines, split_unquoted
+
+MEDIA_PROPERTIES = ("PHOTO", "LOGO", "SOUND", "KEY")
+BLOB_SCHEME = "blob:sha256:"
+MEDIA_FORMATS = {
+	"JPEG": "image/jpeg",
+	"JPG": "image/jpeg",
+	"PNG": "image/png",
+	"GIF": "image/gif",
+	"BMP": "image/bmp",
+	"WEBP": "image/webp",
+	"SVG": "image/svg+xml",
+	"OGG": "audio/ogg",
+	"MP3": "audio/mpeg",
+	"WAV": "audio/wav",
+	"PGP": "application/pgp-keys",
+	"X509": "application/pkix-cert"
+}
+
+
+def media_line(line: str):
+	head_value = split_unquoted(line, ":", 1)
+	if len(head_value) != 2:
+		return None
+	head, value = head_value
+	head_parts = split_unquoted(head, ";")
+	name = head_parts[0]
+	bare_name = name.rsplit(".", 1)[-1].upper()
+	if bare_name not in MEDIA_PROPERTIES:
+		return None
+	params = []
+	for part in head_parts[1:]:
+		key, _, param_value = part.partition("=")
+		params.append((key.upper(), param_value))
+	return name, params, value
+
+
+def decode_inline(params: list, value: str):
+	if value[:5].lower() == "data:" and "," in value:
+		header, payload = value[5:].split(",", 1)
+		if not header.lower().endswith(";base64"):
+			return None
+		media_type = header[:-7] or "application/octet-stream"
+	elif any(key == "ENCODING" and param_value.upper() in ("B", "BASE64") for key, param_value in params):
+		payload = value
+		formats = [param_value.upper() for key, param_value in params if key == "TYPE"]
+		media_type = next((MEDIA_FORMATS[fmt] for fmt in formats if fmt in MEDIA_FORMATS), "application/octet-stream")
+	else:
+		return None
+	try:
+		return base64.b64decode(payload.strip(), validate = False), media_type
+	except (binascii.Error, ValueError):
+		return None
+
+
+def extract_media(text: str, min_bytes: int) -> tuple:
+	"""Moves inline base64 media of at least `min_bytes` out of a vCard, returning the slim text and {digest: (data, media_type)}."""
+	blobs = {}
+	lines = []
+	for line in iter_lines(text):
+		parsed = media_line(line)
+		decoded = decode_inline(parsed[1], parsed[2]) if parsed else None
+		if not decoded or len(decoded[0]) < min_bytes:
+			lines.append(line)
+			continue
+		name, params, _ = parsed
+		data, media_type = decoded
+		digest = hashlib.sha256(data).hexdigest()
+		blobs[digest] = (data, media_type)
+		kept = [
+			f"{key}={param_value}" if param_value else key
+			for key, param_value in params
+			if key not in ("ENCODING", "VALUE", "MEDIATYPE") and not (key == "TYPE" and param_value.upper() in MEDIA_FORMATS)
+		]
+		lines.append(";".join([name] + kept + [f"MEDIATYPE={media_type}"]) + ":" + BLOB_SCHEME + digest)
+	return "\r\n".join(fold_line(line) for line in lines) + "\r\n", blobs
+
+
+def blob_references(text: str) -> list:
+	"""Lists the digests of every blob reference in a vCard, in order of first appearance."""
+	digests = []
+	for line in iter_lines(text):
+		parsed = media_line(line) if BLOB_SCHEME in line else None
+		if parsed and parsed[2].startswith(BLOB_SCHEME) and parsed[2][len(BLOB_SCHEME):] not in digests:
+			digests.append(parsed[2][len(BLOB_SCHEME):])
+	return digests
+
+
+def valid_digest(digest: str) -> bool:
+	return len(digest) == 64 and all(ch in "0123456789abcdef" for ch in digest)
+
+
+def blob_line(line: str, version: str, target: str, inline: bool) -> str:
+	name, params, _ = media_line(line)
+	media_type = next((param_value for key, param_value in params if key == "MEDIATYPE"), "application/octet-stream")
+	kept = [f"{key}={param_value}" if param_value else key for key, param_value in params if key != "MEDIATYPE"]
+	if inline and version.startswith("3"):
+		fmt = media_type.split("/")[-1].upper()
+		return ";".join([name] + kept + ["ENCODING=b", f"TYPE={fmt}"]) + ":" + target
+	if inline:
+		return ";".join([name] + kept) + f":data:{media_type};base64,{target}"
+	if version.startswith("3"):
+		return ";".join([name] + kept + ["VALUE=uri"]) + ":" + target
+	return ";".join([name] + kept + [f"MEDIATYPE={media_type}"]) + ":" + target
+
+
+def vcard_version(lines: list) -> str:
+	for line in lines:
+		if line.upper().startswith("VERSION:"):
+			return line[8:].strip()
+	return "4.0"
+
+
+def resolve_media(text: str, base_url: str) -> str:
+	"""Replaces blob references with URIs served by `GET /blobs/{digest}`."""
+	if BLOB_SCHEME not in text:
+		return text
+	lines = list(iter_lines(text))
+	version = vcard_version(lines)
+	return "\r\n".join(
+		fold_line(blob_line(line, version, f"{base_url.rstrip('/')}/blobs/{line.rsplit(BLOB_SCHEME, 1)[1]}", False))
+		if BLOB_SCHEME in line and media_line(line) else fold_line(line)
+		for line in lines
+	) + "\r\n"
+
+
+async def inline_media(text: str, store) -> str:
+	"""Streams referenced blobs back into the vCard as base64 values."""
+	if BLOB_SCHEME not in text:
+		return text
+	lines = list(iter_lines(text))
+	version = vcard_version(lines)
+	resolved = []
+	for line in lines:
+		if BLOB_SCHEME in line and media_line(line):
+			found = await store.get(line.rsplit(BLOB_SCHEME, 1)[1])
+			if found:
+				line = blob_line(line, version, base64.b64encode(found[0]).decode(), True)
+		resolved.append(fold_line(line))
+	return "\r\n".join(resolved) + "\r\n"
+
+
+class FileBlobStore:
+	def __init__(self, directory: str):
+		self.directory = directory
+
+	def _path(self, digest: str) -> str:
+		return os.path.join(self.directory, digest[:2], digest)
+
+	def _write(self, digest: str, data: bytes, media_type: str):
+		path = self._path(digest)
+		if os.path.exists(path):
+			return
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		with open(path + ".type", "w", encoding = "utf-8") as f:
+			f.write(media_type)
+		temp = f"{path}.{os.getpid()}.tmp"
+		with open(temp, "wb") as f:
+			f.write(data)
+		os.replace(temp, path)
+
+	def _read_type(self, digest: str) -> str | None:
+		try:
+			with open(self._path(digest) + ".type", encoding = "utf-8") as f:
+				return f.read().strip()
+		except FileNotFoundError:
+			return None
+
+	async def put(self, digest: str, data: bytes, media_type: str):
+		await asyncio.to_thread(self._write, digest, data, media_type)
+
+	async def get(self, digest: str):
+		opened = await self.open(digest)
+		if not opened:
+			return None
+		media_type, chunks = opened
+		return b"".join([chunk async for chunk in chunks]), media_type
+
+	async def exists(self, digest: str) -> bool:
+		return valid_digest(digest) and await asyncio.to_thread(os.path.exists, self._path(digest))
+
+	async def open(self, digest: str, chunk_size: int = 65536):
+		if not valid_digest(digest):
+			return None
+		media_type = await asyncio.to_thread(self._read_type, digest)
+		if media_type is None or not os.path.exists(self._path(digest)):
+			return None
+
+		async def chunks():
+			with open(self._path(digest), "rb") as f:
+				while chunk := await asyncio.to_thread(f.read, chunk_size):
+					yield chunk
+
+		return media_type, chunks()
+
+
+class GridFSBlobStore:
+	def __init__(self, db, bucket_name: str = "blobs"):
+		from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+		self.files = db[f"{bucket_name}.files"]
+		self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name = bucket_name)
+
+	async def put(self, digest: str, data: bytes, media_type: str):
+		if await self.files.find_one({"filename": digest}, {"_id": 1}):
+			return
+		await self.bucket.upload_from_stream(digest, data, metadata = {"media_type": media_type})
+
+	async def exists(self, digest: str) -> bool:
+		return valid_digest(digest) and bool(await self.files.find_one({"filename": digest}, {"_id": 1}))
+
+	async def get(self, digest: str):
+		opened = await self.open(digest)
+		if not opened:
+			return None
+		media_type, chunks = opened
+		return b"".join([chunk async for chunk in chunks]), media_type
+
+	async def open(self, digest: str, chunk_size: int = 65536):
+		record = await self.files.find_one({"filename": digest}, {"metadata": 1})
+		if not record:
+			return None
+		grid_out = await self.bucket.open_download_stream(record["_id"])
+
+		async def chunks():
+			while chunk := await grid_out.readchunk():
+				yield chunk
+
+		return (record.get("metadata") or {}).get("media_type", "application/octet-stream"), chunks()
@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import asyncio
+import zipfile
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+	import segno
+except ImportError:
+	segno = None
+
+QR_FORMATS = {
+	"png": "image/png",
+	"svg": "image/svg+xml"
+}
+QR_SIZES = {
+	"small": 4,
+	"medium": 10,
+	"large": 25
+}
+NDEF_MEDIA_TYPE = "application/vnd.nfc.ndef"
+# NFC Forum URI record prefixes, longest first so "https://www." wins over "https://".
+NDEF_URI_PREFIXES = (
+	("https://www.", 0x02),
+	("http://www.", 0x01),
+	("https://", 0x04),
+	("http://", 0x03)
+)
+
+
+def render_qr(url: str, fmt: str, scale: int) -> bytes:
+	buffer = io.BytesIO()
+	segno.make_qr(url, error = "m").save(buffer, kind = fmt, scale = scale, border = 4)
+	return buffer.getvalue()
+
+
+def ndef_message(url: str) -> bytes:
+	"""Encodes `url` as a single NDEF URI record, ready to write to an NTAG."""
+	code = 0x00
+	for prefix, prefix_code in NDEF_URI_PREFIXES:
+		if url.startswith(prefix):
+			code = prefix_code
+			url = url[len(prefix):]
+			break
+	payload = bytes([code]) + url.encode("utf-8")
+	if len(payload) < 256:
+		# MB | ME | SR, TNF well-known
+		return bytes([0xD1, 1, len(payload)]) + b"U" + payload
+	return bytes([0xC1, 1]) + len(payload).to_bytes(4, "big") + b"U" + payload
+
+
+class CodeCache:
+	"""
+		Caches rendered QR codes on disk under `directory/<card_id>/<version>-<size>.<format>`.
+		Encoding runs in a process pool so large batches never hold the event loop.
+	"""
+
+	def __init__(self, directory: str, workers: int | None = None):
+		self.directory = directory
+		self.workers = workers
+		self._pool = None
+		self._rendering = {}
+
+	@property
+	def available(self) -> bool:
+		return segno is not None
+
+	def _executor(self) -> ProcessPoolExecutor:
+		if self._pool is None:
+			# Spawned rather than forked: the API process runs the log writer and driver threads.
+			self._pool = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+		return self._pool
+
+	def _path(self, card_id: str, version: str, fmt: str, size: str) -> str:
+		return os.path.join(self.directory, card_id, f"{version}-{size}.{fmt}")
+
+	def _read(self, path: str) -> bytes | None:
+		try:
+			with open(path, "rb") as f:
+				return f.read()
+		except FileNotFoundError:
+			return None
+
+	def _write(self, path: str, data: bytes):
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		temp = f"{path}.{os.getpid()}.tmp"
+		with open(temp, "wb") as f:
+			f.write(data)
+		os.replace(temp, path)
+
+	async def qr(self, card_id: str, version: str, url: str, fmt: str = "png", size: str = "medium") -> bytes:
+		path = self._path(card_id, version, fmt, size)
+		cached = await asyncio.to_thread(self._read, path)
+		if cached is not None:
+			return cached
+		# Concurrent requests for the same render share one job.
+		rendering = self._rendering.get(path)
+		if rendering is None:
+			rendering = asyncio.ensure_future(self._render(path, url, fmt, QR_SIZES[size]))
+			self._rendering[path] = rendering
+			rendering.add_done_callback(lambda _: self._rendering.pop(path, None))
+		return await asyncio.shield(rendering)
+
+	async def _render(self, path: str, url: str, fmt: str, scale: int) -> bytes:
+		data = await asyncio.get_running_loop().run_in_executor(self._executor(), render_qr, url, fmt, scale)
+		await asyncio.to_thread(self._write, path, data)
+		return data
+
+	async def bundle(self, cards: list, fmt: str = "png", size: str = "medium") -> bytes:
+		"""Zips a QR code and NDEF record per (card_id, version, url) for a print order."""
+		rendered = await asyncio.gather(*(self.qr(card_id, version, url, fmt, size) for card_id, version, url in cards))
+		return await asyncio.to_thread(self._zip, cards, rendered, fmt)
+
+	def _zip(self, cards: list, rendered: list, fmt: str) -> bytes:
+		buffer = io.BytesIO()
+		# PNGs are already deflated; storing them keeps exports fast.
+		with zipfile.ZipFile(buffer, "w", compression = zipfile.ZIP_STORED) as archive:
+			for (card_id, _, url), data in zip(cards, rendered):
+				archive.writestr(f"{card_id}.{fmt}", data)
+				archive.writestr(f"{card_id}.ndef", ndef_message(url))
+		return buffer.getvalue()
+
+	async def invalidate(self, card_id: str):
+		await asyncio.to_thread(shutil.rmtree, os.path.join(self.directory, card_id), True)
+
+	def close(self):
+		if self._pool is not None:
+			self._pool.shutdown(wait = False, cancel_futures = True)
+			self._pool = None
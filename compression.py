@@ -0,0 +1,107 @@
+import gzip
+import asyncio
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+# Bigger bodies are compressed on a worker thread; zlib and brotli release the GIL.
+THREAD_THRESHOLD = 1024 * 1024
+
+
+def negotiate_encoding(accept_encoding: str, available: tuple = ENCODINGS) -> str | None:
+	"""Picks the client's highest-q encoding from `available`, preferring earlier entries on ties."""
+	weights = {}
+	for part in accept_encoding.lower().split(","):
+		coding, _, params = part.strip().partition(";")
+		q = 1.0
+		params = params.strip()
+		if params.startswith("q="):
+			try:
+				q = float(params[2:])
+			except ValueError:
+				q = 0.0
+		if coding:
+			weights[coding] = q
+	best = None
+	for encoding in available:
+		q = weights.get(encoding, weights.get("*", 0.0))
+		if q > 0 and (best is None or q > best[1]):
+			best = (encoding, q)
+	return best[0] if best else None
+
+
+def compress(data: bytes, encoding: str, level: int = 5) -> bytes:
+	if encoding == "br":
+		return brotli.compress(data, quality = level)
+	# mtime=0 keeps the output deterministic so stored variants and ETags stay stable.
+	return gzip.compress(data, compresslevel = level, mtime = 0)
+
+
+def precompressed(data: bytes) -> dict:
+	"""Returns {encoding: compressed} at maximum effort, for payloads compressed once and served many times."""
+	return {encoding: compress(data, encoding, 11 if encoding == "br" else 9) for encoding in ENCODINGS}
+
+
+class CompressionMiddleware:
+	"""
+		Compresses complete JSON responses of at least `minimum_size` bytes with the negotiated encoding.
+		Streamed bodies and responses that already carry a Content-Encoding pass through untouched.
+	"""
+
+	def __init__(self, app, minimum_size: int = 1024, level: int = 5, media_types: tuple = ("application/json",)):
+		self.app = app
+		self.minimum_size = minimum_size
+		self.level = level
+		self.media_types = media_types
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			return await self.app(scope, receive, send)
+		headers = dict(scope.get("headers") or [])
+		encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+		if not encoding:
+			return await self.app(scope, receive, send)
+		state = {"start": None}
+
+		async def compressing_send(message):
+			start = state["start"]
+			if message["type"] == "http.response.start":
+				state["start"] = message
+				return
+			if start is None:
+				return await send(message)
+			state["start"] = None
+			body = message.get("body", b"")
+			if message.get("more_body") or len(body) < self.minimum_size or not self._eligible(start["headers"]):
+				await send(start)
+				return await send(message)
+			if len(body) >= THREAD_THRESHOLD:
+				body = await asyncio.to_thread(compress, body, encoding, self.level)
+			else:
+				body = compress(body, encoding, self.level)
+			start["headers"] = [(key, value) for key, value in start["headers"] if key.lower() not in (b"content-length", b"vary")] + [
+				(b"content-encoding", encoding.encode()),
+				(b"content-length", str(len(body)).encode()),
+				(b"vary", self._vary(start["headers"]))
+			]
+			await send(start)
+			await send({"type": "http.response.body", "body": body})
+
+		await self.app(scope, receive, compressing_send)
+
+	def _eligible(self, headers) -> bool:
+		content_type = b""
+		for key, value in headers:
+			key = key.lower()
+			if key == b"content-encoding":
+				return False
+			if key == b"content-type":
+				content_type = value
+		return content_type.decode("latin-1").startswith(self.media_types)
+
+	def _vary(self, headers) -> bytes:
+		existing = [value for key, value in headers if key.lower() == b"vary"]
+		return b", ".join(existing + [b"Accept-Encoding"])
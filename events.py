@@ -0,0 +1,151 @@
+import asyncio
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+WATCHED_COLLECTIONS = {
+	"user_cards": "card",
+	"users": "user"
+}
+HIDDEN_FIELDS = ("token", "pin", "search_terms", "variants")
+
+
+def strip_hidden(fields: dict | None) -> dict:
+	if not fields:
+		return {}
+	return {
+		key: value
+		for key, value in fields.items()
+		if key.split(".", 1)[0] not in HIDDEN_FIELDS
+	}
+
+
+def change_to_event(change: dict) -> dict | None:
+	kind = WATCHED_COLLECTIONS.get(change.get("ns", {}).get("coll"))
+	if not kind:
+		return None
+	op = change.get("operationType")
+	doc_id = change.get("documentKey", {}).get("_id")
+	document = change.get("fullDocument") or {}
+	if op == "update":
+		fields = change.get("updateDescription", {}).get("updatedFields")
+	elif op in ("insert", "replace"):
+		fields = document
+	else:
+		fields = None
+	return {
+		"type": kind,
+		"op": op,
+		"id": str(doc_id),
+		"owner_id": doc_id if kind == "user" else document.get("owner_id"),
+		"fields": strip_hidden(fields)
+	}
+
+
+class Subscriber:
+	def __init__(self, owner_id, is_admin: bool, queue_size: int):
+		self.owner_id = owner_id
+		self.is_admin = is_admin
+		self.queue = asyncio.Queue(maxsize = queue_size)
+		self.dropped = 0
+
+	def wants(self, event: dict) -> bool:
+		if self.is_admin:
+			return True
+		return event.get("owner_id") is not None and event.get("owner_id") == self.owner_id
+
+	def offer(self, event: dict):
+		try:
+			self.queue.put_nowait(event)
+		except asyncio.QueueFull:
+			# A consumer that cannot keep up loses its backlog and is told to refetch,
+			# so a slow dashboard never holds more than one queue worth of events.
+			self.dropped += self.queue.qsize()
+			while not self.queue.empty():
+				self.queue.get_nowait()
+			self.queue.put_nowait({"type": "resync", "op": "overflow", "dropped": self.dropped})
+
+
+class EventHub:
+	"""Fans out card and account changes from one shared change stream to SSE subscribers."""
+
+	def __init__(self, db, queue_size: int = 256, heartbeat: float = 15.0, retry_delay: float = 5.0):
+		self.db = db
+		self.queue_size = queue_size
+		self.heartbeat = heartbeat
+		self.retry_delay = retry_delay
+		self.subscribers: set[Subscriber] = set()
+		# Called synchronously with every published event, e.g. to invalidate caches.
+		self.observers = []
+		self.watching = False
+		self._resume_token = None
+		self._task: asyncio.Task | None = None
+
+	def subscribe(self, owner_id, is_admin: bool) -> Subscriber:
+		subscriber = Subscriber(owner_id, is_admin, self.queue_size)
+		self.subscribers.add(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber: Subscriber):
+		self.subscribers.discard(subscriber)
+
+	def publish(self, event: dict):
+		for observer in self.observers:
+			observer(event)
+		for subscriber in tuple(self.subscribers):
+			if subscriber.wants(event):
+				subscriber.offer(event)
+
+	def publish_local(self, event: dict):
+		# Writers announce their own changes only when no change stream is feeding the hub,
+		# otherwise every change would be delivered twice.
+		if not self.watching:
+			event["fields"] = strip_hidden(event.get("fields"))
+			self.publish(event)
+
+	async def start(self):
+		if self._task is None:
+			self._task = asyncio.create_task(self._watch())
+
+	async def stop(self):
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		self.watching = False
+
+	async def _watch(self):
+		pipeline = [
+			{
+				"$match": {
+					"ns.coll": {
+						"$in": list(WATCHED_COLLECTIONS)
+					}
+				}
+			}
+		]
+		while True:
+			try:
+				async with self.db.watch(
+					pipeline,
+					full_document = "updateLookup",
+					resume_after = self._resume_token
+				) as stream:
+					self.watching = True
+					async for change in stream:
+						self._resume_token = stream.resume_token
+						event = change_to_event(change)
+						if event:
+							self.publish(event)
+			except OperationFailure as e:
+				self.watching = False
+				if e.code == 40573 or "replica set" in str(e).lower():
+					# Standalone servers have no change streams; stay on the in-process bus.
+					return
+				self._resume_token = None
+				await asyncio.sleep(self.retry_delay)
+			except PyMongoError:
+				self.watching = False
+				await asyncio.sleep(self.retry_delay)
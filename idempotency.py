@@ -0,0 +1,200 @@
+import json
+import asyncio
+import hashlib
+import datetime
+import functools
+
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pymongo.errors import DuplicateKeyError
+
+MAX_KEY_LENGTH = 255
+
+
+def now() -> datetime.datetime:
+	return datetime.datetime.now(datetime.timezone.utc)
+
+
+class IdempotencyStore:
+	"""
+		Remembers the response to each `Idempotency-Key` so retried writes replay it instead of running again.
+		Records live in a TTL-indexed collection shared by every worker, fronted by a small in-process LRU;
+		concurrent duplicates in one worker wait on the first, and in other workers get 409 until it finishes.
+	"""
+
+	def __init__(self, ttl: int = 86400, pending_ttl: int = 60, cache_size: int = 10000):
+		self.ttl = ttl
+		self.pending_ttl = pending_ttl
+		self.cache_size = cache_size
+		self.records = None
+		self._cache = OrderedDict()
+		self._inflight = {}
+
+	def bind(self, records):
+		self.records = records
+
+	async def prepare(self):
+		await self.records.create_index("expires_at", expireAfterSeconds = 0)
+
+	async def run(self, scope: str, fingerprint: str, call) -> Response:
+		cached = self._cached(scope)
+		if cached:
+			return self._replay(cached, fingerprint)
+		waiting = self._inflight.get(scope)
+		if waiting is not None:
+			stored = await asyncio.shield(waiting)
+			return self._replay(stored, fingerprint) if stored else await self.run(scope, fingerprint, call)
+
+		future = asyncio.get_running_loop().create_future()
+		self._inflight[scope] = future
+		stored = None
+		try:
+			existing = await self._claim(scope, fingerprint)
+			if existing is not None:
+				if existing.get("status") == "pending":
+					return JSONResponse(
+						content = {
+							"error": "request_in_progress"
+						},
+						status_code = 409,
+						headers = {"Retry-After": "1"}
+					)
+				if existing.get("status") == "in_doubt":
+					return JSONResponse(
+						content = {
+							"error": "request_in_doubt"
+						},
+						status_code = 409
+					)
+				stored = self._remember(scope, existing)
+				return self._replay(stored, fingerprint)
+			response = await self._execute(call, scope)
+			if response.status_code < 500:
+				stored = await self._complete(scope, fingerprint, response)
+			else:
+				await self.records.delete_one({"_id": scope, "status": "pending"})
+			return response
+		finally:
+			self._inflight.pop(scope, None)
+			future.set_result(stored)
+
+	async def _execute(self, call, scope: str) -> Response:
+		try:
+			response = await call()
+		except BaseException:
+			# The handler may have written before it failed or was cancelled, so running it again
+			# could duplicate those writes: hold the key for as long as a completed one is kept.
+			await asyncio.shield(
+				self.records.update_one(
+					{"_id": scope, "status": "pending"},
+					{"$set": {"status": "in_doubt", "expires_at": now() + datetime.timedelta(seconds = self.ttl)}}
+				)
+			)
+			raise
+		if not isinstance(response, Response):
+			response = JSONResponse(content = jsonable_encoder(response))
+		return response
+
+	async def _claim(self, scope: str, fingerprint: str) -> dict | None:
+		"""Inserts a pending record, returning None when this request owns the key, else the existing record."""
+		pending = {
+			"fingerprint": fingerprint,
+			"status": "pending",
+			"expires_at": now() + datetime.timedelta(seconds = self.pending_ttl)
+		}
+		try:
+			await self.records.insert_one({"_id": scope, **pending})
+			return None
+		except DuplicateKeyError:
+			pass
+		# A pending record past its deadline belongs to a worker that died mid-request; take it over.
+		# In-doubt records are never taken over, only dropped by the TTL index.
+		taken = await self.records.find_one_and_update(
+			{"_id": scope, "status": "pending", "expires_at": {"$lt": now()}},
+			{"$set": pending}
+		)
+		if taken:
+			return None
+		return await self.records.find_one({"_id": scope}) or {"status": "pending"}
+
+	async def _complete(self, scope: str, fingerprint: str, response: Response) -> tuple:
+		record = {
+			"fingerprint": fingerprint,
+			"status": "complete",
+			"status_code": response.status_code,
+			"media_type": response.headers.get("content-type"),
+			"body": bytes(response.body),
+			"expires_at": now() + datetime.timedelta(seconds = self.ttl)
+		}
+		await self.records.update_one({"_id": scope}, {"$set": record})
+		return self._remember(scope, record)
+
+	def _remember(self, scope: str, record: dict) -> tuple:
+		stored = (record["fingerprint"], record["status_code"], record.get("media_type"), bytes(record["body"]), record["expires_at"])
+		self._cache[scope] = stored
+		self._cache.move_to_end(scope)
+		while len(self._cache) > self.cache_size:
+			self._cache.popitem(last = False)
+		return stored
+
+	def _cached(self, scope: str) -> tuple | None:
+		stored = self._cache.get(scope)
+		if stored is None:
+			return None
+		expires_at = stored[4]
+		if expires_at.tzinfo is None:
+			expires_at = expires_at.replace(tzinfo = datetime.timezone.utc)
+		if expires_at <= now():
+			del self._cache[scope]
+			return None
+		self._cache.move_to_end(scope)
+		return stored
+
+	def _replay(self, stored: tuple, fingerprint: str) -> Response:
+		if stored[0] != fingerprint:
+			return JSONResponse(
+				content = {
+					"error": "idempotency_key_reused"
+				},
+				status_code = 422
+			)
+		return Response(
+			content = stored[3],
+			status_code = stored[1],
+			headers = {
+				"Content-Type": stored[2] or "application/json",
+				"Idempotent-Replayed": "true"
+			}
+		)
+
+
+def idempotent(handler):
+	"""
+		Decorates a route taking `request: Request` with the app's `IdempotencyStore`, looked up on
+		`request.app.state.idempotency` per call; requests without the header run as before.
+	"""
+
+	@functools.wraps(handler)
+	async def wrapper(**kwargs):
+		request = kwargs["request"]
+		key = request.headers.get("Idempotency-Key")
+		if key is None:
+			return await handler(**kwargs)
+		if not key or len(key) > MAX_KEY_LENGTH:
+			return JSONResponse(
+				content = {
+					"error": "invalid_idempotency_key"
+				},
+				status_code = 400
+			)
+		# Keys are scoped to the caller and route, so one client can never replay another's response.
+		scope = hashlib.sha256(
+			"\n".join((request.method, request.url.path, request.headers.get("Authorization") or "", key)).encode()
+		).hexdigest()
+		payload = {name: value for name, value in kwargs.items() if name != "request"}
+		fingerprint = hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys = True).encode()).hexdigest()
+		return await request.app.state.idempotency.run(scope, fingerprint, lambda: handler(**kwargs))
+
+	return wrapper
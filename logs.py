@@ -0,0 +1,135 @@
+import sys
+import json
+import time
+import queue
+import random
+import logging
+import contextvars
+
+from logging.handlers import QueueHandler, QueueListener
+
+request_context = contextvars.ContextVar("request_context", default = None)
+
+
+class RequestContext:
+	__slots__ = ("scope", "started")
+
+	def __init__(self, scope):
+		self.scope = scope
+		self.started = time.perf_counter()
+
+	def fields(self) -> dict:
+		route = self.scope.get("route")
+		fields = {
+			"method": self.scope.get("method"),
+			"route": getattr(route, "path", None) or self.scope.get("path"),
+			"elapsed_ms": round((time.perf_counter() - self.started) * 1000, 2)
+		}
+		path_params = self.scope.get("path_params") or {}
+		if "card_id" in path_params:
+			fields["card_id"] = path_params["card_id"]
+		return fields
+
+
+class JSONFormatter(logging.Formatter):
+	def format(self, record) -> str:
+		payload = {
+			"ts": round(record.created, 3),
+			"level": record.levelname,
+			"logger": record.name,
+			"message": record.getMessage()
+		}
+		payload.update(getattr(record, "context", None) or {})
+		payload.update(getattr(record, "fields", None) or {})
+		if record.exc_info:
+			payload["exc"] = self.formatException(record.exc_info)
+		return json.dumps(payload, default = str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+	"""Hands records to the writer thread without formatting them, dropping and counting on overflow."""
+
+	def __init__(self, log_queue: queue.Queue):
+		super().__init__(log_queue)
+		self.dropped = 0
+		self.sampled_out = 0
+
+	def filter(self, record) -> bool:
+		rate = getattr(record, "sample_rate", 1.0)
+		if rate < 1.0 and random.random() >= rate:
+			self.sampled_out += 1
+			return False
+		return super().filter(record)
+
+	def prepare(self, record):
+		# The request context lives in a contextvar on the event loop, so it is captured here;
+		# formatting and I/O happen on the writer thread.
+		context = request_context.get()
+		if context is not None:
+			record.context = context.fields()
+		return record
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+
+
+class ReportingStreamHandler(logging.StreamHandler):
+	def __init__(self, source: NonBlockingQueueHandler, stream = None):
+		super().__init__(stream)
+		self.source = source
+		self.reported = (0, 0)
+
+	def emit(self, record):
+		counts = (self.source.dropped, self.source.sampled_out)
+		if counts[0] != self.reported[0]:
+			self.stream.write(json.dumps({"ts": round(time.time(), 3), "level": "WARNING", "message": "log_records_dropped", "dropped": counts[0], "sampled_out": counts[1]}) + self.terminator)
+			self.reported = counts
+		super().emit(record)
+
+
+def setup_logging(name: str = "cards", level: str = "INFO", queue_size: int = 10000, stream = None) -> QueueListener:
+	"""Routes the `name` logger through a bounded queue to a JSON writer thread; start() the returned listener."""
+	log_queue = queue.Queue(maxsize = queue_size)
+	handler = NonBlockingQueueHandler(log_queue)
+	output = ReportingStreamHandler(handler, stream or sys.stdout)
+	output.setFormatter(JSONFormatter())
+	logger = logging.getLogger(name)
+	logger.handlers = [handler]
+	logger.setLevel(level)
+	logger.propagate = False
+	return QueueListener(log_queue, output, respect_handler_level = True)
+
+
+class RequestContextMiddleware:
+	def __init__(self, app, logger: logging.Logger, sample_rate: float = 0.01):
+		self.app = app
+		self.logger = logger
+		self.sample_rate = sample_rate
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			return await self.app(scope, receive, send)
+		context = RequestContext(scope)
+		token = request_context.set(context)
+		status = {}
+
+		async def tracked_send(message):
+			if message["type"] == "http.response.start":
+				status["code"] = message["status"]
+			await send(message)
+
+		try:
+			await self.app(scope, receive, tracked_send)
+		finally:
+			code = status.get("code", 500)
+			self.logger.info(
+				"request",
+				extra = {
+					"fields": {"status": code},
+					"sample_rate": 1.0 if code >= 500 else self.sample_rate
+				}
+			)
+			request_context.reset(token)
@@ -1,76 +1,505 @@
 import os
 import re
+import json
+import asyncio
+import logging
 import uvicorn
 import random
 import string
 import binascii
 import datetime
+import functools
 
-from urllib.parse import quote_plus
+from contextlib import asynccontextmanager
 from dotenv import find_dotenv, load_dotenv
-from fastapi import FastAPI, Request, Response
+from fastapi import APIRouter, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError, ServerSelectionTimeoutError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from blobs import BLOB_SCHEME, FileBlobStore, blob_references, GridFSBlobStore, extract_media, inline_media, resolve_media
+from codes import NDEF_MEDIA_TYPE, QR_FORMATS, QR_SIZES, CodeCache, ndef_message
+from compression import ENCODINGS, CompressionMiddleware, negotiate_encoding
+from events import EventHub
+from idempotency import IdempotencyStore, idempotent
+from logs import RequestContextMiddleware, setup_logging
+from monitoring import ProfilingMiddleware, SlowQueryListener
+from resilience import BreakerHeartbeatListener, CircuitBreaker, DatabaseGuardMiddleware
+from response_cache import ResponseCache
+from settings import Settings
+from variants import VCARD_VARIANTS, build_variants
+from vcard_builder import VCardError, normalize_vcard, transcode_vcard
 
 load_dotenv(find_dotenv())
-app = FastAPI()
-db = AsyncIOMotorClient(
-	f"mongodb://{quote_plus(os.getenv('MONGO_USER'))}:{quote_plus(os.getenv('MONGO_PASS'))}@{quote_plus(os.getenv('MONGO_HOST'))}",
-	tls = True,
-	tlsCertificateKeyFile = "./certs/mongo.pem",
-	tlsCAFile = "./certs/ca.crt",
-	tlsAllowInvalidCertificates = True
-)["cards"]
-collection = db["user_cards"]
-
-app.add_middleware(
-	CORSMiddleware,
-	allow_origins = ["https://portal.uwitz.cards"],
-	allow_credentials = True,
-	allow_methods = ["*"],
-	allow_headers = ["*"]
+logger = logging.getLogger("cards")
+
+READ_PREFERENCES = {
+	"primary": Primary,
+	"primaryPreferred": PrimaryPreferred,
+	"secondary": Secondary,
+	"secondaryPreferred": SecondaryPreferred,
+	"nearest": Nearest
+}
+
+router = APIRouter()
+
+def routed_collection(db, name: str, mode: str, max_staleness: int, read_concern: str):
+	return db.get_collection(
+		name,
+		read_preference = Primary() if mode == "primary" else READ_PREFERENCES[mode](max_staleness = max_staleness),
+		read_concern = ReadConcern(read_concern)
+	)
+
+def connect(state):
+	"""Opens the app's database handles on `app.state`; the client itself connects lazily."""
+	settings = state.settings
+	tls = {
+		"tls": True,
+		"tlsCertificateKeyFile": settings.mongo_tls_cert_file,
+		"tlsCAFile": settings.mongo_tls_ca_file,
+		"tlsAllowInvalidCertificates": True
+	} if settings.mongo_tls else {}
+	state.db = db = AsyncIOMotorClient(
+		settings.mongo_url,
+		maxPoolSize = settings.mongo_max_pool_size,
+		minPoolSize = settings.mongo_min_pool_size,
+		maxIdleTimeMS = settings.mongo_max_idle_ms,
+		serverSelectionTimeoutMS = settings.mongo_server_selection_timeout_ms,
+		connectTimeoutMS = settings.mongo_connect_timeout_ms,
+		socketTimeoutMS = settings.mongo_socket_timeout_ms,
+		event_listeners = [state.slow_queries, BreakerHeartbeatListener(state.breaker)],
+		**tls
+	)[settings.mongo_database]
+	state.collection = db["user_cards"]
+	# Anonymous taps and admin listings tolerate bounded staleness and go to secondaries;
+	# token lookups, activation, payouts and every write stay on the primary via `db`.
+	state.tap_cards = routed_collection(db, "user_cards", settings.tap_read_preference, settings.tap_max_staleness, settings.tap_read_concern)
+	state.listing_cards = routed_collection(db, "user_cards", settings.listing_read_preference, settings.listing_max_staleness, settings.listing_read_concern)
+	state.listing_users = routed_collection(db, "users", settings.listing_read_preference, settings.listing_max_staleness, settings.listing_read_concern)
+	state.events = EventHub(db, queue_size = settings.events_queue_size, heartbeat = settings.events_heartbeat)
+	# Change stream events carry writes made by other workers; owner-less ones (deletes) clear everything.
+	state.events.observers.append(lambda event: state.response_cache.bump(event.get("owner_id")))
+	state.blob_store = FileBlobStore(settings.blob_dir) if settings.blob_backend == "file" else GridFSBlobStore(db)
+	state.idempotency.bind(db["idempotency_keys"])
+
+async def warm_pool(state):
+	try:
+		await asyncio.wait_for(
+			asyncio.gather(*(state.db.client.admin.command("ping") for _ in range(max(state.settings.mongo_min_pool_size, 1)))),
+			timeout = state.settings.mongo_warmup_timeout
+		)
+	except (asyncio.TimeoutError, PyMongoError) as e:
+		state.breaker.trip()
+		logger.error("Database warm-up failed", extra = {"fields": {"error": repr(e)}})
+
+def log_task_failure(task: asyncio.Task):
+	if not task.cancelled() and task.exception():
+		logger.error("Background task failed", extra = {"fields": {"task": task.get_coro().__qualname__}}, exc_info = task.exception())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	state = app.state
+	# Logging is process-wide, so it is taken over by the app that runs rather than every app built.
+	state.log_listener = setup_logging(level = state.settings.log_level, queue_size = state.settings.log_queue_size)
+	state.log_listener.start()
+	connect(state)
+	await warm_pool(state)
+	await state.events.start()
+	if state.settings.prepare_database:
+		index_build = asyncio.create_task(prepare_database(state))
+		state.background_tasks.add(index_build)
+		index_build.add_done_callback(state.background_tasks.discard)
+		index_build.add_done_callback(log_task_failure)
+	yield
+	await state.events.stop()
+	for task in tuple(state.background_tasks):
+		task.cancel()
+	state.code_cache.close()
+	state.db.client.close()
+	state.log_listener.stop()
+
+async def is_admin_token(state, token: str) -> bool:
+	if not token:
+		return False
+	auth_user = await state.db["users"].find_one({"token": token}, {"is_admin": 1})
+	return bool(auth_user and auth_user.get("is_admin"))
+
+async def transition(target, query: dict, update: dict, projection: dict | None = None, sharded: bool = False) -> dict | None:
+	# Conditional state change in one round-trip: the query carries the precondition and the
+	# updated document comes back, or None when the precondition no longer holds.
+	if sharded:
+		# Before MongoDB 7.1, findAndModify on a sharded collection needs the shard key in its filter.
+		document = await target.find_one(query, {"organisation": 1})
+		if document is None:
+			return None
+		query = {**query, "_id": document["_id"], "organisation": document.get("organisation")}
+	return await target.find_one_and_update(
+		query,
+		update,
+		projection = projection,
+		return_document = ReturnDocument.AFTER
+	)
+
+VCARD3_AGENTS = ("iphone", "ipad", "ios", "cfnetwork", "android", "dalvik", "outlook", "microsoft")
+# Cards with a precomputed variant skip `content` entirely; legacy cards and URL cards still get it.
+# Clients accepting an encoding also get the matching pre-compressed variant, when one was stored.
+TAP_PROJECTIONS = {
+	(key, encoding): {
+		"type": 1,
+		"status": 1,
+		"blobs": 1,
+		f"variants.{key}": 1,
+		**({f"variants.{key}_{encoding}": 1} if encoding else {}),
+		"content": {"$cond": [{"$ifNull": [f"$variants.{key}", False]}, "$$REMOVE", "$content"]}
+	}
+	for key in VCARD_VARIANTS.values()
+	for encoding in (None,) + ENCODINGS
+}
+
+def negotiate_vcard_version(accept: str, user_agent: str, default_version: str = "4.0") -> str:
+	accept = accept.lower()
+	if "version=4" in accept:
+		return "4.0"
+	if "version=3" in accept or "text/x-vcard" in accept or "text/directory" in accept:
+		return "3.0"
+	user_agent = user_agent.lower()
+	if any(agent in user_agent for agent in VCARD3_AGENTS):
+		return "3.0"
+	return default_version
+
+
+def vcard_variants(settings: Settings, content: str) -> dict:
+	return build_variants(content, settings.blob_base_url if settings.blob_serve_mode != "inline" else None)
+
+def vcard_error_response(error: VCardError) -> JSONResponse:
+	return JSONResponse(
+		content = {
+			"error": error.code,
+			"detail": error.detail
+		},
+		status_code = 413 if error.code == "vcard_too_large" else 400
+	)
+
+async def backfill_vcard_variants(state):
+	batch = []
+	missing = {"$exists": False}
+	query = {
+		"type": "vcard",
+		"$or": [{"variants": missing}] + [
+			# Cards whose blob references are resolved per request never get compressed variants.
+			{f"variants.{key}_{ENCODINGS[0]}": missing, **({} if state.settings.blob_base_url and state.settings.blob_serve_mode != "inline" else {"blobs.0": missing})}
+			for key in VCARD_VARIANTS.values()
+		]
+	}
+	async for card in state.collection.find(query, {"content": 1}):
+		batch.append(UpdateOne({"_id": card["_id"]}, {"$set": {"variants": await asyncio.to_thread(vcard_variants, state.settings, card.get("content") or "")}}))
+		if len(batch) >= 100:
+			await state.collection.bulk_write(batch, ordered = False)
+			batch = []
+	if batch:
+		await state.collection.bulk_write(batch, ordered = False)
+
+async def store_media(state, content: str) -> tuple:
+	slim, blobs = await asyncio.to_thread(extract_media, content, state.settings.blob_min_bytes)
+	if len(slim.encode("utf-8")) > state.settings.vcard_max_stored_bytes:
+		raise VCardError("vcard_too_large", f"vCard exceeds {state.settings.vcard_max_stored_bytes} bytes once media is extracted")
+	if blobs:
+		await asyncio.gather(*(state.blob_store.put(digest, data, media_type) for digest, (data, media_type) in blobs.items()))
+	else:
+		slim = content
+	# Content echoed back from /meta or /cards already carries references; those must point at stored blobs.
+	referenced = blob_references(slim)
+	stored = await asyncio.gather(*(state.blob_store.exists(digest) for digest in referenced if digest not in blobs))
+	if not all(stored):
+		raise VCardError("unknown_blob", "vCard references a blob that does not exist")
+	return slim, referenced
+
+def record_change(state, kind: str, op: str, doc_id, owner_id, fields: dict | None = None):
+	state.response_cache.bump(owner_id)
+	state.events.publish_local(
+		{
+			"type": kind,
+			"op": op,
+			"id": str(doc_id),
+			"owner_id": owner_id,
+			"fields": fields or {}
+		}
+	)
+
+USER_KEYS = (
+	"id",
+	"display_name",
+	"email",
+	"plan_expiry",
+	"referral",
+	"referral_reward",
+	"currency",
+	"payouts",
+	"username",
+	"is_admin",
+	"plan",
+	"organisation",
+	"status",
+	"transactions",
+	"created_at",
+	"updated_at"
+)
+PROFILE_KEYS = USER_KEYS + ("token", "cards")
+CARD_KEYS = (
+	"id",
+	"tier",
+	"owner_id",
+	"type",
+	"content",
+	"payment_id",
+	"organisation",
+	"views",
+	"status",
+	"version",
+	"created_at",
+	"updated_at"
 )
+META_KEYS = tuple(key for key in CARD_KEYS if key not in ("id", "owner_id"))
+FIELD_DEFAULTS = {
+	"referral_reward": 0.0,
+	"currency": "MYR",
+	"payouts": [],
+	"views": 0
+}
+
+def parse_fields(fields: str | None, allowed: tuple) -> tuple | None:
+	if not fields:
+		return None
+	requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+	if not requested or any(field not in allowed for field in requested):
+		return None
+	return requested
+
+def field_projection(keys: tuple, *required: str) -> dict:
+	projection = {"_id": 1}
+	for key in keys + required:
+		if key != "id":
+			projection[key] = 1
+	return projection
+
+def render_document(document: dict, keys: tuple) -> dict:
+	view = {}
+	for key in keys:
+		if key == "id":
+			view["id"] = str(document.get("_id"))
+		elif key == "owner_id":
+			view["owner_id"] = str(document.get("owner_id"))
+		elif key == "updated_at":
+			view["updated_at"] = document.get("updated_at") or None
+		else:
+			view[key] = document.get(key, FIELD_DEFAULTS.get(key))
+	return view
+
+def invalid_fields_response() -> JSONResponse:
+	return JSONResponse(
+		content = {
+			"error": "invalid_fields"
+		},
+		status_code = 400
+	)
+
+SEARCH_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+USER_SEARCH_FIELDS = ("username", "email", "display_name", "organisation")
+
+def search_terms(*values) -> list:
+	terms = set()
+	for value in values:
+		if not isinstance(value, str) or not value.strip():
+			continue
+		value = value.strip().lower()
+		terms.add(value)
+		terms.update(SEARCH_TOKEN_PATTERN.findall(value))
+	return sorted(terms)
+
+def user_search_terms(user: dict) -> list:
+	return search_terms(*(user.get(field) for field in USER_SEARCH_FIELDS))
+
+def card_search_terms(card: dict) -> list:
+	return search_terms(str(card.get("_id")), card.get("organisation"))
+
+def search_score(terms: list, tokens: list, primary: str | None) -> int:
+	score = 0
+	for token in tokens:
+		if primary and primary.lower() == token:
+			score += 10
+		elif token in terms:
+			score += 3
+		elif primary and primary.lower().startswith(token):
+			score += 2
+		else:
+			score += 1
+	return score
+
+async def backfill_search_terms(target, build_terms, fields: dict):
+	batch = []
+	async for document in target.find({"search_terms": {"$exists": False}}, fields):
+		batch.append(UpdateOne({"_id": document["_id"]}, {"$set": {"search_terms": build_terms(document)}}))
+		if len(batch) >= 500:
+			await target.bulk_write(batch, ordered = False)
+			batch = []
+	if batch:
+		await target.bulk_write(batch, ordered = False)
+
+async def prepare_search(state):
+	await state.db["users"].create_index("search_terms")
+	await state.collection.create_index("search_terms")
+	await backfill_search_terms(state.db["users"], user_search_terms, {field: 1 for field in USER_SEARCH_FIELDS})
+	await backfill_search_terms(state.collection, card_search_terms, {"organisation": 1})
+
+ORG_SHARD_KEY = [("organisation", 1), ("_id", 1)]
+
+async def prepare_organisations(state):
+	# Every document carries `organisation` (null for individuals) so {organisation, _id}
+	# can serve as the shard key for both collections.
+	await state.db["users"].update_many({"organisation": {"$exists": False}}, {"$set": {"organisation": None}})
+	await state.collection.update_many({"organisation": {"$exists": False}}, {"$set": {"organisation": None}})
+	await state.db["users"].create_index(ORG_SHARD_KEY)
+	await state.collection.create_index(ORG_SHARD_KEY)
+	await state.collection.create_index([("organisation", 1), ("owner_id", 1)])
+	if state.settings.mongo_shard_collections:
+		try:
+			await state.db.client.admin.command("enableSharding", state.db.name)
+			for name in ("users", "user_cards"):
+				await state.db.client.admin.command("shardCollection", f"{state.db.name}.{name}", key = dict(ORG_SHARD_KEY))
+		except OperationFailure as e:
+			logger.error("Database error in prepare_organisations", exc_info = e)
+
+async def prepare_usernames(state):
+	users = state.db["users"]
+	# Accounts created before usernames were unique keep the oldest holder's name; later ones are renamed.
+	duplicates = users.aggregate(
+		[
+			{"$match": {"username": {"$gt": ""}}},
+			{"$sort": {"created_at": 1}},
+			{"$group": {"_id": "$username", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+			{"$match": {"count": {"$gt": 1}}}
+		],
+		allowDiskUse = True
+	)
+	async for group in duplicates:
+		for user_id in group["ids"][1:]:
+			renamed = f"{group['_id'][:24]}-{str(user_id)[:7]}"
+			await users.update_one({"_id": user_id}, {"$set": {"username": renamed}, "$unset": {"search_terms": ""}})
+			logger.warning("Renamed duplicate username", extra = {"fields": {"user_id": str(user_id), "username": group["_id"], "renamed": renamed}})
+	indexes = await users.index_information()
+	if "username_1" in indexes and not indexes["username_1"].get("unique"):
+		await users.drop_index("username_1")
+	await users.create_index("username", unique = True, partialFilterExpression = {"username": {"$gt": ""}})
+
+async def prepare_database(state):
+	await prepare_usernames(state)
+	await state.idempotency.prepare()
+	await prepare_organisations(state)
+	await prepare_search(state)
+	await backfill_vcard_variants(state)
 
-@app.get("/")
+@router.get("/")
 async def read_root():
 	return "OK"
 
-@app.get("/{card_id}")
-async def read_card(request: Request, card_id: str):
-	try:
-		data: dict = await request.body()
-		user_card = await collection.find_one({"_id": card_id})
-		if not user_card:
-			return RedirectResponse(url = "https://uwitz.cards")
-		
-		if user_card.get("status") == "pending" and not data:
-			return RedirectResponse(url = f"https://portal.uwitz.cards/setup/{card_id}")
-
-		if user_card.get("status") == "pending" and user_card.get("pin") == data.get("pin"):
-			await collection.update_one(
-				{"_id": card_id},
-				{
-					"$set": {
-						"status": "active"
-					}
-				}
-			)
-			return JSONResponse(
-				content = {
-					"status": "active"
-				}
-			)
+@router.get("/events")
+async def stream_events(request: Request):
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
+	if not auth_user:
+		return JSONResponse(
+			{
+				"error": "invalid_token"
+			},
+			401
+		)
+	subscriber = state.events.subscribe(auth_user.get("_id"), bool(auth_user.get("is_admin")))
 
-		elif user_card.get("status") == "pending" and user_card.get("pin") != data.get("pin"):
-			return JSONResponse(
-				content = {
-					"error": "invalid_card_pin"
-				},
-				status_code = 401
-			)
+	async def event_stream():
+		try:
+			yield f"retry: {int(state.events.retry_delay * 1000)}\n\n"
+			while True:
+				try:
+					event = await asyncio.wait_for(subscriber.queue.get(), timeout = state.events.heartbeat)
+				except asyncio.TimeoutError:
+					if await request.is_disconnected():
+						break
+					yield ": heartbeat\n\n"
+					continue
+				yield f"event: {event['type']}\ndata: {json.dumps(event, default = str)}\n\n"
+		finally:
+			state.events.unsubscribe(subscriber)
 
+	return StreamingResponse(
+		event_stream(),
+		media_type = "text/event-stream",
+		headers = {
+			"Cache-Control": "no-cache",
+			"X-Accel-Buffering": "no"
+		}
+	)
+
+@router.get("/search")
+async def search(request: Request, q: str = "", kind: str = "all", offset: int = 0, limit: int = 20):
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
+	if not auth_user or not auth_user.get("is_admin"):
+		return JSONResponse(
+			{
+				"error": "unauthorized"
+			},
+			401
+		)
+	tokens = q.strip().lower().split()
+	if not tokens or kind not in ("all", "users", "cards"):
+		return JSONResponse(
+			content = {
+				"error": "invalid_query"
+			},
+			status_code = 400
+		)
+	offset = max(offset, 0)
+	limit = min(max(limit, 1), 100)
+	query = {
+		"search_terms": {
+			"$all": [re.compile("^" + re.escape(token)) for token in tokens]
+		}
+	}
+	results = []
+	truncated = False
+	try:
+		if kind in ("all", "users"):
+			matches = await state.listing_users.find(
+				query,
+				field_projection(("username", "email", "display_name", "organisation", "plan", "status", "search_terms"))
+			).to_list(state.settings.search_candidates)
+			truncated = truncated or len(matches) >= state.settings.search_candidates
+			for user in matches:
+				results.append(
+					{
+						"type": "user",
+						"score": search_score(user.get("search_terms", []), tokens, user.get("username")),
+						**render_document(user, ("id", "username", "email", "display_name", "organisation", "plan", "status"))
+					}
+				)
+		if kind in ("all", "cards"):
+			matches = await state.listing_cards.find(
+				query,
+				field_projection(("owner_id", "type", "tier", "organisation", "status", "search_terms"))
+			).to_list(state.settings.search_candidates)
+			truncated = truncated or len(matches) >= state.settings.search_candidates
+			for card in matches:
+				results.append(
+					{
+						"type": "card",
+						"score": search_score(card.get("search_terms", []), tokens, str(card.get("_id"))),
+						**render_document(card, ("id", "owner_id", "type", "tier", "organisation", "status"))
+					}
+				)
 	except ServerSelectionTimeoutError:
 		return JSONResponse(
 			content = {
@@ -78,30 +507,45 @@ async def read_card(request: Request, card_id: str):
 			},
 			status_code = 503
 		)
-	except Exception as e:
-		print(f"Database error in read_card: {e}")
+	results.sort(key = lambda result: (-result["score"], len(result.get("username") or result["id"])))
+	return {
+		"results": results[offset:offset + limit],
+		"total": len(results),
+		"truncated": truncated,
+		"offset": offset,
+		"limit": limit
+	}
+
+@router.get("/blobs/{digest}")
+async def read_blob(request: Request, digest: str):
+	state = request.app.state
+	opened = await state.blob_store.open(digest.lower())
+	if not opened:
 		return JSONResponse(
 			content = {
-				"error": "internal"
+				"error": "not_found"
 			},
-			status_code = 500
-		)
-	if user_card.get("type") == "vcard":
-		return Response(
-			content = user_card.get("content"),
-			media_type = "text/vcard",
-			headers = {
-				"Content-Disposition": "attachment; filename=contact.vcf"
-			}
+			status_code = 404
 		)
-	elif user_card.get("type") == "url":
-		return RedirectResponse(url = user_card.get("content"))
-	else:
-		return RedirectResponse(url = "https://uwitz.cards")
+	media_type, chunks = opened
+	return StreamingResponse(
+		chunks,
+		media_type = media_type,
+		headers = {
+			"Cache-Control": "public, max-age=31536000, immutable",
+			"ETag": f'"{digest.lower()}"'
+		}
+	)
 
-@app.get("/user/{user_id}")
+@router.get("/user/{user_id}")
 async def head_user(request: Request, user_id: str):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	cache_key = ("user", request.headers.get("Authorization"), user_id)
+	cached = state.response_cache.get(cache_key)
+	if cached:
+		return cached
+	stamp = state.response_cache.stamp()
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user or not auth_user.get("is_admin") and not auth_user.get("_id") == user_id:
 		return JSONResponse(
 			{
@@ -109,7 +553,7 @@ async def head_user(request: Request, user_id: str):
 			},
 			401
 		)
-	user_record = await db["users"].find_one({"_id": user_id})
+	user_record = await state.db["users"].find_one({"_id": user_id})
 	if not user_record:
 		return JSONResponse(
 			{
@@ -118,7 +562,7 @@ async def head_user(request: Request, user_id: str):
 			404
 		)
 	else:
-		return JSONResponse(
+		response = JSONResponse(
 			content = {
 				"id": user_record.get("_id"),
 				"display_name": user_record.get("display_name"),
@@ -139,11 +583,22 @@ async def head_user(request: Request, user_id: str):
 			},
 			status_code = 200
 		)
+		state.response_cache.put(cache_key, stamp, (auth_user.get("_id"), user_id), response)
+		return response
 
-@app.get("/meta/{card_id}")
-async def head_card(request: Request, card_id: str):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
-	user_card = await collection.find_one({"_id": card_id})
+@router.get("/meta/{card_id}")
+async def head_card(request: Request, card_id: str, fields: str | None = None):
+	state = request.app.state
+	keys = parse_fields(fields, META_KEYS) if fields else META_KEYS
+	if keys is None:
+		return invalid_fields_response()
+	cache_key = ("meta", request.headers.get("Authorization"), card_id, keys)
+	cached = state.response_cache.get(cache_key)
+	if cached:
+		return cached
+	stamp = state.response_cache.stamp()
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
+	user_card = await state.collection.find_one({"_id": card_id}, field_projection(keys, "owner_id"))
 	if not auth_user:
 		return JSONResponse(
 			content = {
@@ -160,26 +615,191 @@ async def head_card(request: Request, card_id: str):
 		)
 
 	else:
+		response = JSONResponse(
+			content = render_document(user_card, keys),
+			status_code = 200
+		)
+		state.response_cache.put(cache_key, stamp, (auth_user.get("_id"), user_card.get("owner_id")), response)
+		return response
+
+def tap_url(settings: Settings, card_id: str) -> str:
+	return f"{settings.tap_base_url.rstrip('/')}/{card_id}"
+
+def tap_origin_unconfigured(settings: Settings) -> JSONResponse | None:
+	# Never fall back to the request's own origin: behind the proxy that is the bind address or a client-supplied Host.
+	if settings.tap_base_url:
+		return None
+	return JSONResponse(
+		content = {
+			"error": "tap_origin_unconfigured"
+		},
+		status_code = 501
+	)
+
+def code_version(card: dict) -> str:
+	return str(card.get("updated_at") or card.get("created_at") or "0")
+
+async def owned_card(request: Request, card_id: str) -> tuple:
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
+	if not auth_user:
+		return None, JSONResponse(
+			content = {
+				"error": "token_required"
+			},
+			status_code = 400
+		)
+	user_card = await state.collection.find_one({"_id": card_id}, {"owner_id": 1, "updated_at": 1, "created_at": 1})
+	if not user_card or not auth_user.get("_id") == user_card.get("owner_id") and not auth_user.get("is_admin"):
+		return None, JSONResponse(
+			content = {
+				"error": "not_found"
+			},
+			status_code = 404
+		)
+	return user_card, None
+
+def invalid_code_options(state, fmt: str, size: str) -> JSONResponse | None:
+	error = tap_origin_unconfigured(state.settings)
+	if error:
+		return error
+	if not state.code_cache.available:
 		return JSONResponse(
 			content = {
-				"tier": user_card.get("tier"),
-				"type": user_card.get("type"),
-				"content": user_card.get("content"),
-				"payment_id": user_card.get("payment_id"),
-				"organisation": user_card.get("organisation"),
-				"views": user_card.get("views", 0),
-				"status": user_card.get("status"),
-				"version": user_card.get("version"),
-				"created_at": user_card.get("created_at"),
-				"updated_at": user_card.get("updated_at")
+				"error": "qr_unavailable"
 			},
-			status_code = 200
+			status_code = 501
+		)
+	if fmt not in QR_FORMATS or size not in QR_SIZES:
+		return JSONResponse(
+			content = {
+				"error": "invalid_format"
+			},
+			status_code = 400
+		)
+	return None
+
+@router.get("/meta/{card_id}/qr")
+async def card_qr(request: Request, card_id: str, format: str = "png", size: str = "medium"):
+	state = request.app.state
+	error = invalid_code_options(state, format, size)
+	if error:
+		return error
+	user_card, error = await owned_card(request, card_id)
+	if error:
+		return error
+	return Response(
+		content = await state.code_cache.qr(user_card["_id"], code_version(user_card), tap_url(state.settings, user_card["_id"]), format, size),
+		media_type = QR_FORMATS[format],
+		headers = {
+			"Cache-Control": "private, max-age=86400",
+			"ETag": f'"{user_card["_id"]}-{code_version(user_card)}-{size}-{format}"'
+		}
+	)
+
+@router.get("/meta/{card_id}/ndef")
+async def card_ndef(request: Request, card_id: str):
+	state = request.app.state
+	error = tap_origin_unconfigured(state.settings)
+	if error:
+		return error
+	user_card, error = await owned_card(request, card_id)
+	if error:
+		return error
+	return Response(
+		content = ndef_message(tap_url(state.settings, user_card["_id"])),
+		media_type = NDEF_MEDIA_TYPE,
+		headers = {
+			"Content-Disposition": f"attachment; filename={user_card['_id']}.ndef"
+		}
+	)
+
+@router.post("/codes/batch")
+async def batch_codes(request: Request, data: dict):
+	"""
+		data: {
+			"card_ids": ["..."] | "payment_id": "...",
+			"format": "png" | "svg",
+			"size": "small" | "medium" | "large"
+		}
+	"""
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
+	if not auth_user or not auth_user.get("is_admin"):
+		return JSONResponse(
+			{
+				"error": "unauthorized"
+			},
+			401
+		)
+	fmt = data.get("format", "png")
+	size = data.get("size", "medium")
+	error = invalid_code_options(state, fmt, size)
+	if error:
+		return error
+	if isinstance(data.get("card_ids"), list):
+		query = {"_id": {"$in": [str(card_id) for card_id in data["card_ids"][:state.settings.codes_batch_limit]]}}
+	elif isinstance(data.get("payment_id"), str):
+		query = {"payment_id": data["payment_id"]}
+	else:
+		return JSONResponse(
+			content = {
+				"error": "invalid_order"
+			},
+			status_code = 400
+		)
+	cards = [
+		(user_card["_id"], code_version(user_card), tap_url(state.settings, user_card["_id"]))
+		async for user_card in state.collection.find(query, {"updated_at": 1, "created_at": 1}).sort("_id", 1).limit(state.settings.codes_batch_limit)
+	]
+	if not cards:
+		return JSONResponse(
+			content = {
+				"error": "not_found"
+			},
+			status_code = 404
 		)
+	return Response(
+		content = await state.code_cache.bundle(cards, fmt, size),
+		media_type = "application/zip",
+		headers = {
+			"Content-Disposition": "attachment; filename=codes.zip"
+		}
+	)
 
-@app.post("/profile")
-async def user_profile(request: Request, data: dict):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
-	data_user = await db["users"].find_one({"username": data.get("username")})
+@router.post("/profile")
+async def user_profile(request: Request, data: dict, fields: str | None = None):
+	state = request.app.state
+	if fields:
+		requested = [field.strip() for field in fields.split(",") if field.strip()]
+		card_keys = parse_fields(",".join(field[6:] for field in requested if field.startswith("cards.")), CARD_KEYS)
+		keys = parse_fields(",".join(field for field in requested if not field.startswith("cards.")), PROFILE_KEYS)
+		if card_keys:
+			keys = tuple(dict.fromkeys((keys or ()) + ("cards",)))
+		elif keys and "cards" in keys:
+			card_keys = CARD_KEYS
+		if keys is None or any(field.startswith("cards.") for field in requested) and card_keys is None:
+			return invalid_fields_response()
+	else:
+		keys, card_keys = PROFILE_KEYS, CARD_KEYS
+	if not isinstance(data.get("username"), (str, type(None))):
+		return JSONResponse(
+			content = {
+				"error": "invalid_username"
+			},
+			status_code = 400
+		)
+	user_keys = tuple(key for key in keys if key != "cards")
+	cache_key = ("profile", request.headers.get("Authorization"), data.get("username"), keys, card_keys)
+	cached = state.response_cache.get(cache_key)
+	if cached:
+		return cached
+	stamp = state.response_cache.stamp()
+	auth_user = await state.db["users"].find_one(
+		{"token": request.headers.get("Authorization")},
+		field_projection(user_keys, "status")
+	)
+	data_user = await state.db["users"].find_one({"username": data.get("username")}, {"_id": 1})
 	if not (data.get("username") and data_user and not data_user.get("_id") == auth_user.get("_id")) or not auth_user or not data_user:
 		return JSONResponse(
 			content = {
@@ -196,48 +816,23 @@ async def user_profile(request: Request, data: dict):
 			status_code = 403
 		)
 
-	cards = [
-		{
-			"id": str(card.get("_id")),
-			"tier": card.get("tier"),
-			"owner_id": str(card.get("owner_id")),
-			"type": card.get("type"),
-			"content": card.get("content"),
-			"payment_id": card.get("payment_id"),
-			"organisation": card.get("organisation"),
-			"views": card.get("views", 0),
-			"status": card.get("status"),
-			"version": card.get("version"),
-			"created_at": card.get("created_at"),
-			"updated_at": card.get("updated_at")
-		}
-		async for card in collection.find({"owner_id": data_user.get("_id")})
-	]
-
-	return {
-		"id": str(auth_user.get("_id")),
-		"display_name": auth_user.get("display_name"),
-		"email": auth_user.get("email"),
-		"plan_expiry": auth_user.get("plan_expiry"),
-		"referral": auth_user.get("referral"),
-		"referral_reward": auth_user.get("referral_reward", 0.0),
-		"currency": auth_user.get("currency", "MYR"),
-		"payouts": auth_user.get("payouts", []),
-		"username": auth_user.get("username"),
-		"token": auth_user.get("token"),
-		"is_admin": auth_user.get("is_admin"),
-		"plan": auth_user.get("plan"),
-		"organisation": auth_user.get("organisation"),
-		"status": auth_user.get("status"),
-		"transactions": auth_user.get("transactions"),
-		"cards": cards,
-		"created_at": auth_user.get("created_at"),
-		"updated_at": auth_user.get("updated_at") if auth_user.get("updated_at") else None
-	}
+	profile = render_document(auth_user, user_keys)
+	if "cards" in keys:
+		profile["cards"] = [
+			render_document(card, card_keys)
+			async for card in state.collection.find({"owner_id": data_user.get("_id")}, field_projection(card_keys))
+		]
+	response = JSONResponse(content = profile)
+	state.response_cache.put(cache_key, stamp, (auth_user.get("_id"), data_user.get("_id")), response)
+	return response
 
-@app.get("/users")
-async def list_users(request: Request):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+@router.get("/users")
+async def list_users(request: Request, fields: str | None = None):
+	state = request.app.state
+	keys = parse_fields(fields, USER_KEYS) if fields else USER_KEYS
+	if keys is None:
+		return invalid_fields_response()
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
 	if not auth_user or not auth_user.get("is_admin"):
 		return JSONResponse(
 			{
@@ -247,27 +842,8 @@ async def list_users(request: Request):
 		)
 	user_list = []
 	try:
-		async for user in db["users"].find({}):
-				user_list.append(
-					{
-						"id": str(user.get("_id")),
-						"display_name": user.get("display_name"),
-						"email": user.get("email"),
-						"plan_expiry": user.get("plan_expiry"),
-						"referral": user.get("referral"),
-						"referral_reward": user.get("referral_reward", 0.0),
-						"currency": user.get("currency", "MYR"),
-						"payouts": user.get("payouts", []),
-						"username": user.get("username"),
-						"is_admin": user.get("is_admin"),
-						"plan": user.get("plan"),
-						"organisation": user.get("organisation"),
-						"status": user.get("status"),
-						"transactions": user.get("transactions"),
-						"created_at": user.get("created_at"),
-						"updated_at": user.get("updated_at") if user.get("updated_at") else None
-					}
-				)
+		async for user in state.listing_users.find({}, field_projection(keys)):
+			user_list.append(render_document(user, keys))
 	except ServerSelectionTimeoutError:
 		return JSONResponse(
 			content = {
@@ -276,7 +852,7 @@ async def list_users(request: Request):
 			status_code = 503
 		)
 	except Exception as e:
-		print(f"Database error in list_users: {e}")
+		logger.error("Database error in list_users", exc_info = e)
 		return JSONResponse(
 			content = {
 				"error": "internal"
@@ -287,9 +863,13 @@ async def list_users(request: Request):
 		"users": user_list
 	}
 
-@app.get("/cards")
-async def list_cards(request: Request):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+@router.get("/cards")
+async def list_cards(request: Request, fields: str | None = None):
+	state = request.app.state
+	keys = parse_fields(fields, CARD_KEYS) if fields else CARD_KEYS
+	if keys is None:
+		return invalid_fields_response()
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")}, {"is_admin": 1})
 	if not auth_user or not auth_user.get("is_admin"):
 		return JSONResponse(
 			{
@@ -299,42 +879,9 @@ async def list_cards(request: Request):
 		)
 	user_cards = []
 	try:
-		if auth_user.get("is_admin"):
-			async for card in collection.find({}):
-				user_cards.append(
-					{
-						"id": str(card.get("_id")),
-						"tier": card.get("tier"),
-						"owner_id": str(card.get("owner_id")),
-						"type": card.get("type"),
-						"content": card.get("content"),
-						"payment_id": card.get("payment_id"),
-						"organisation": card.get("organisation"),
-						"views": card.get("views", 0),
-						"status": card.get("status"),
-						"version": card.get("version"),
-						"created_at": card.get("created_at"),
-						"updated_at": card.get("updated_at")
-					}
-				)
-		else:
-			async for card in collection.find({"owner_id": auth_user.get("_id")}):
-				user_cards.append(
-					{
-						"id": str(card.get("_id")),
-						"tier": card.get("tier"),
-						"owner_id": str(card.get("owner_id")),
-						"type": card.get("type"),
-						"content": card.get("content"),
-						"payment_id": card.get("payment_id"),
-						"organisation": card.get("organisation"),
-						"views": card.get("views", 0),
-						"status": card.get("status"),
-						"version": card.get("version"),
-						"created_at": card.get("created_at"),
-						"updated_at": card.get("updated_at")
-					}
-				)
+		query = {} if auth_user.get("is_admin") else {"owner_id": auth_user.get("_id")}
+		async for card in state.listing_cards.find(query, field_projection(keys)):
+			user_cards.append(render_document(card, keys))
 	except ServerSelectionTimeoutError:
 		return JSONResponse(
 			content = {
@@ -343,7 +890,7 @@ async def list_cards(request: Request):
 			status_code = 503
 		)
 	except Exception as e:
-		print(f"Database error in list_cards: {e}")
+		logger.error("Database error in list_cards", exc_info = e)
 		return JSONResponse(
 			content = {
 				"error": "internal"
@@ -354,9 +901,142 @@ async def list_cards(request: Request):
 		"cards": user_cards
 	}
 
-@app.post("/payout")
+def can_view_organisation(auth_user: dict | None, organisation: str) -> bool:
+	if not auth_user:
+		return False
+	return bool(auth_user.get("is_admin") or (auth_user.get("is_org_admin") and auth_user.get("organisation") == organisation))
+
+async def list_organisation(target, organisation: str, keys: tuple, after: str | None, limit: int) -> dict:
+	query = {"organisation": organisation}
+	if after:
+		query["_id"] = {"$gt": after}
+	documents = await target.find(query, field_projection(keys)).sort("_id", 1).limit(limit).to_list(limit)
+	return {
+		"items": [render_document(document, keys) for document in documents],
+		"next": str(documents[-1]["_id"]) if len(documents) == limit else None
+	}
+
+@router.get("/org/{organisation}/users")
+async def list_organisation_users(request: Request, organisation: str, fields: str | None = None, after: str | None = None, limit: int = 100):
+	state = request.app.state
+	keys = parse_fields(fields, USER_KEYS) if fields else USER_KEYS
+	if keys is None:
+		return invalid_fields_response()
+	auth_user = await state.db["users"].find_one(
+		{"token": request.headers.get("Authorization")},
+		{"is_admin": 1, "is_org_admin": 1, "organisation": 1}
+	)
+	if not can_view_organisation(auth_user, organisation):
+		return JSONResponse(
+			{
+				"error": "unauthorized"
+			},
+			401
+		)
+	try:
+		page = await list_organisation(state.listing_users, organisation, keys, after, min(max(limit, 1), 500))
+	except ServerSelectionTimeoutError:
+		return JSONResponse(
+			content = {
+				"error": "timeout"
+			},
+			status_code = 503
+		)
+	return {
+		"users": page["items"],
+		"next": page["next"]
+	}
+
+@router.get("/org/{organisation}/cards")
+async def list_organisation_cards(request: Request, organisation: str, fields: str | None = None, after: str | None = None, limit: int = 100):
+	state = request.app.state
+	keys = parse_fields(fields, CARD_KEYS) if fields else CARD_KEYS
+	if keys is None:
+		return invalid_fields_response()
+	auth_user = await state.db["users"].find_one(
+		{"token": request.headers.get("Authorization")},
+		{"is_admin": 1, "is_org_admin": 1, "organisation": 1}
+	)
+	if not can_view_organisation(auth_user, organisation):
+		return JSONResponse(
+			{
+				"error": "unauthorized"
+			},
+			401
+		)
+	try:
+		page = await list_organisation(state.listing_cards, organisation, keys, after, min(max(limit, 1), 500))
+	except ServerSelectionTimeoutError:
+		return JSONResponse(
+			content = {
+				"error": "timeout"
+			},
+			status_code = 503
+		)
+	return {
+		"cards": page["items"],
+		"next": page["next"]
+	}
+
+@router.get("/org/{organisation}/stats")
+async def organisation_stats(request: Request, organisation: str):
+	state = request.app.state
+	auth_user = await state.db["users"].find_one(
+		{"token": request.headers.get("Authorization")},
+		{"is_admin": 1, "is_org_admin": 1, "organisation": 1}
+	)
+	if not can_view_organisation(auth_user, organisation):
+		return JSONResponse(
+			{
+				"error": "unauthorized"
+			},
+			401
+		)
+	try:
+		user_groups = await state.listing_users.aggregate(
+			[
+				{"$match": {"organisation": organisation}},
+				{"$group": {"_id": "$status", "count": {"$sum": 1}}}
+			]
+		).to_list(None)
+		card_groups = await state.listing_cards.aggregate(
+			[
+				{"$match": {"organisation": organisation}},
+				{"$group": {"_id": {"status": "$status", "tier": "$tier"}, "count": {"$sum": 1}, "views": {"$sum": {"$ifNull": ["$views", 0]}}}}
+			]
+		).to_list(None)
+	except ServerSelectionTimeoutError:
+		return JSONResponse(
+			content = {
+				"error": "timeout"
+			},
+			status_code = 503
+		)
+	cards_by_status = {}
+	cards_by_tier = {}
+	for group in card_groups:
+		status, tier = group["_id"].get("status"), group["_id"].get("tier")
+		cards_by_status[str(status)] = cards_by_status.get(str(status), 0) + group["count"]
+		cards_by_tier[str(tier)] = cards_by_tier.get(str(tier), 0) + group["count"]
+	return {
+		"organisation": organisation,
+		"users": {
+			"total": sum(group["count"] for group in user_groups),
+			"by_status": {str(group["_id"]): group["count"] for group in user_groups}
+		},
+		"cards": {
+			"total": sum(group["count"] for group in card_groups),
+			"views": sum(group["views"] for group in card_groups),
+			"by_status": cards_by_status,
+			"by_tier": cards_by_tier
+		}
+	}
+
+@router.post("/payout")
+@idempotent
 async def create_payout_request(request: Request, payout: dict):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user:
 		return JSONResponse({"error": "invalid_token"}, 401)
 	if auth_user.get("plan_expiry") and int(auth_user.get("plan_expiry")) < int(datetime.datetime.now(datetime.timezone.utc).timestamp()):
@@ -369,12 +1049,14 @@ async def create_payout_request(request: Request, payout: dict):
 		"status": "pending",
 		"created_at": str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
 	}
-	await db["users"].update_one({"_id": auth_user.get("_id")}, {"$push": {"payouts": payout_entry}})
+	await state.db["users"].update_one({"_id": auth_user.get("_id")}, {"$push": {"payouts": payout_entry}})
+	record_change(state, "user", "update", auth_user.get("_id"), auth_user.get("_id"), {"payouts": payout_entry})
 	return {"payout_id": code, "status": "pending"}
 
-@app.post("/admin/payout")
+@router.post("/admin/payout")
 async def admin_mark_payout_claimed(request: Request, data: dict):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user or not auth_user.get("is_admin"):
 		return JSONResponse({"error": "unauthorized"}, 401)
 	user_id = data.get("user_id")
@@ -382,18 +1064,76 @@ async def admin_mark_payout_claimed(request: Request, data: dict):
 	if not user_id or not payout_id:
 		return JSONResponse({"error": "user_id_and_id_required"}, 400)
 	ts = str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
-	result = await db["users"].update_one(
+	result = await state.db["users"].update_one(
 		{"_id": user_id, "payouts.id": payout_id},
 		{"$set": {"payouts.$.status": "claimed", "payouts.$.claimed_at": ts}}
 	)
 	if result.matched_count == 0:
 		return JSONResponse({"error": "not_found"}, 404)
+	record_change(state, "user", "update", user_id, user_id, {"payouts.$.status": "claimed", "payouts.$.id": payout_id})
 	return {"status": "claimed", "id": payout_id}
 
-@app.post("/create/user")
-async def create_user(request: Request, user: dict):
-	auth_user = await db["admin"].find_one({"token": request.headers.get("Authorization")})
+USERNAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_-]{0,31}$")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def build_new_user(user: dict) -> tuple:
+	"""Validates a create-user payload, returning (new_user, None) or (None, error_code)."""
+	if not isinstance(user, dict):
+		return None, "invalid_user"
+	if not user.get("username"):
+		return None, "username_missing"
+	username = str(user.get("username")).strip().lower()
+	if not USERNAME_PATTERN.match(username):
+		return None, "invalid_username"
+	email = user.get("email")
+	if not email:
+		return None, "email_missing"
+	email = str(email).strip().lower()
+	if not EMAIL_PATTERN.match(email):
+		return None, "invalid_email"
+
+	plan_value = user.get("plan", "individual")
+	now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+	new_user = {
+		"_id": "".join(random.choices(string.digits, k = 10)) + "." + str(now),
+		"username": username,
+		"display_name": user.get("display_name", username),
+		"email": email,
+		"plan_expiry": None if plan_value == "individual" else str(now + 30 * 24 * 60 * 60),
+		"referral": "".join(random.choices(string.ascii_uppercase + string.digits, k = 6)),
+		"referral_reward": 0,
+		"currency": user.get("currency", "MYR"),
+		"payouts": [],
+		"token": binascii.hexlify(os.urandom(20)).decode(),
+		"is_admin": False,
+		"plan": plan_value,
+		"organisation": user.get("organisation", None),
+		"status": "active",
+		"transactions": [],
+		"created_at": str(now),
+		"updated_at": str(now)
+	}
+	new_user["search_terms"] = user_search_terms(new_user)
+	return new_user, None
+
+def created_user(new_user: dict) -> dict:
+	return {
+		"id": str(new_user["_id"]),
+		"display_name": new_user["display_name"],
+		"email": new_user["email"],
+		"plan_expiry": new_user["plan_expiry"],
+		"referral": new_user["referral"],
+		"referral_reward": new_user["referral_reward"],
+		"currency": new_user["currency"],
+		"payouts": new_user["payouts"],
+		"username": new_user["username"],
+		"token": new_user["token"]
+	}
+
+async def admin_check(request: Request) -> JSONResponse | None:
+	state = request.app.state
 	try:
+		auth_user = await state.db["admin"].find_one({"token": request.headers.get("Authorization")})
 		if auth_user is None:
 			return JSONResponse(
 				content = {
@@ -409,96 +1149,156 @@ async def create_user(request: Request, user: dict):
 			status_code = 503
 		)
 	except Exception as e:
-		print(f"Database error in auth check: {e}")
+		logger.error("Database error in auth check", exc_info = e)
 		return JSONResponse(
 			content = {
 				"error": "internal"
 			},
 			status_code = 500
 		)
+	return None
 
-	if not user.get("username"):
+@router.post("/create/user")
+@idempotent
+async def create_user(request: Request, user: dict):
+	state = request.app.state
+	error = await admin_check(request)
+	if error:
+		return error
+
+	new_user, error = build_new_user(user)
+	if error:
 		return JSONResponse(
 			content = {
-				"error": "username_missing"
+				"error": error
 			},
 			status_code = 400
 		)
-
-	username = str(user.get("username")).strip().lower()
-	unix_username_pattern = re.compile(r"^[a-z_][a-z0-9_-]{0,31}$")
-	if not unix_username_pattern.match(username):
-		return JSONResponse(
-			content = {"error": "invalid_username"},
-			status_code = 400
-		)
-
-	email = user.get("email")
-	if email:
-		email = email.strip().lower()
-		email_pattern = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
-		if email and not email_pattern.match(email):
-			return JSONResponse(
-				content = {"error": "invalid_email"},
-				status_code = 400
-			)
-
-	else:
+	duplicate = await state.db["users"].find_one({"username": new_user["username"]}, {"_id": 1})
+	if not duplicate:
+		try:
+			await state.db["users"].insert_one(new_user)
+		except DuplicateKeyError:
+			duplicate = True
+	if duplicate:
 		return JSONResponse(
 			content = {
-				"error": "email_missing"
+				"error": "duplicate_username"
 			},
-			status_code = 400
+			status_code = 409
 		)
+	record_change(state, "user", "insert", new_user["_id"], new_user["_id"], new_user)
+	return JSONResponse(
+		content = created_user(new_user),
+		status_code = 201
+	)
 
-	plan_value = user.get("plan", "individual")
-	plan_expiry = None if plan_value == "individual" else str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()) + 30 * 24 * 60 * 60)
+async def create_user_batch(state, rows: list) -> list:
+	"""Creates users for [(row, payload)] with one username lookup and one insert_many."""
+	results = {}
+	candidates = {}
+	for row, user in rows:
+		new_user, error = build_new_user(user)
+		if error:
+			results[row] = {"row": row, "error": error}
+		elif new_user["username"] in candidates:
+			results[row] = {"row": row, "error": "duplicate_username"}
+		else:
+			candidates[new_user["username"]] = (row, new_user)
+	if candidates:
+		taken = await state.db["users"].distinct("username", {"username": {"$in": list(candidates)}})
+		for username in taken:
+			row, _ = candidates.pop(username)
+			results[row] = {"row": row, "error": "duplicate_username"}
+	pending = list(candidates.values())
+	failed = {}
+	if pending:
+		try:
+			await state.db["users"].insert_many([new_user for _, new_user in pending], ordered = False)
+		except BulkWriteError as e:
+			failed = {error["index"]: "duplicate_username" if error.get("code") == 11000 and "username" in (error.get("keyPattern") or {}) else "insert_failed" for error in e.details.get("writeErrors", [])}
+	for index, (row, new_user) in enumerate(pending):
+		if index in failed:
+			results[row] = {"row": row, "error": failed[index]}
+			continue
+		record_change(state, "user", "insert", new_user["_id"], new_user["_id"], new_user)
+		results[row] = {"row": row, "status": "created", **created_user(new_user)}
+	return [results[row] for row, _ in rows]
 
-	new_user = {
-		"_id": "".join(random.choices(string.digits, k = 10)) + "." + str(int(datetime.datetime.now().timestamp())),
-		"username": username,
-		"display_name": user.get("display_name", username),
-		"email": email if isinstance(email, str) else None,
-		"plan_expiry": plan_expiry,
-		"referral": "".join(random.choices(string.ascii_uppercase + string.digits, k = 6)),
-		"referral_reward": 0,
-		"currency": user.get("currency", "MYR"),
-		"payouts": [],
-		"token": binascii.hexlify(os.urandom(20)).decode(),
-		"is_admin": False,
-		"plan": plan_value,
-		"organisation": user.get("organisation", None),
-		"status": "active",
-		"transactions": [],
-		"created_at": str(int(datetime.datetime.now(datetime.timezone.utc).timestamp())),
-		"updated_at": str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
-	}
-	if await db["users"].find_one({"username": username, "_id": {"$ne": new_user["_id"]}}):
+async def ndjson_rows(request: Request):
+	buffer = b""
+	row = 0
+	async for chunk in request.stream():
+		buffer += chunk
+		*lines, buffer = buffer.split(b"\n")
+		for line in lines:
+			if line.strip():
+				yield row, line
+				row += 1
+	if buffer.strip():
+		yield row, buffer
+
+@router.post("/create/users")
+async def create_users(request: Request):
+	"""
+		JSON body: {"users": [{...create/user payload...}, ...]} -> {"results": [...], "created": n, "failed": n}
+		NDJSON body (Content-Type: application/x-ndjson): one payload per line -> one result per line, streamed
+	"""
+	state = request.app.state
+	error = await admin_check(request)
+	if error:
+		return error
+
+	if request.headers.get("Content-Type", "").startswith(("application/x-ndjson", "application/jsonl")):
+		# The body has to be read here: once the response starts, the server's disconnect
+		# listener consumes the request messages and the stream would never see them.
+		lines = [(row, line) async for row, line in ndjson_rows(request)]
+
+		async def stream_results():
+			batch = []
+			for row, line in lines:
+				try:
+					batch.append((row, json.loads(line)))
+				except ValueError:
+					yield json.dumps({"row": row, "error": "invalid_json"}) + "\n"
+					continue
+				if len(batch) >= state.settings.create_users_batch:
+					for result in await create_user_batch(state, batch):
+						yield json.dumps(result) + "\n"
+					batch = []
+			if batch:
+				for result in await create_user_batch(state, batch):
+					yield json.dumps(result) + "\n"
+
+		return StreamingResponse(stream_results(), media_type = "application/x-ndjson")
+
+	try:
+		body = await request.json()
+	except ValueError:
+		body = None
+	users = body.get("users") if isinstance(body, dict) else body
+	if not isinstance(users, list) or not users:
 		return JSONResponse(
 			content = {
-				"error": "duplicate_username"
+				"error": "users_missing"
 			},
-			status_code = 409
+			status_code = 400
 		)
-	else:
-		await db["users"].insert_one(new_user)
+	results = []
+	for offset in range(0, len(users), state.settings.create_users_batch):
+		results.extend(await create_user_batch(state, list(enumerate(users[offset:offset + state.settings.create_users_batch], offset))))
+	created = sum(1 for result in results if result.get("status") == "created")
 	return JSONResponse(
 		content = {
-			"id": str(new_user["_id"]),
-			"display_name": new_user["display_name"],
-			"email": new_user["email"],
-			"plan_expiry": new_user["plan_expiry"],
-			"referral": new_user["referral"],
-			"referral_reward": new_user["referral_reward"],
-			"currency": new_user["currency"],
-			"payouts": new_user["payouts"],
-			"username": new_user["username"],
-			"token": new_user["token"]
+			"results": results,
+			"created": created,
+			"failed": len(results) - created
 		},
-		status_code = 201
+		status_code = 201 if created else 400
 	)
 
-@app.post("/create/card")
+@router.post("/create/card")
+@idempotent
 async def create_card(request: Request, card: dict):
 	"""
 		card: {
@@ -508,7 +1308,8 @@ async def create_card(request: Request, card: dict):
 			"payment_id": "optional, for tracking payments"
 		}
 	"""
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user or not auth_user.get("is_admin"):
 		return JSONResponse(
 			{
@@ -526,15 +1327,11 @@ async def create_card(request: Request, card: dict):
 		)
 
 	content = card.get("content")
-	if card.get("type") == "vcard" and (
-		not content or not (content.startswith("BEGIN:VCARD") or content.endswith("END:VCARD"))
-	):
-		return JSONResponse(
-			content = {
-				"error": "invalid_format"
-			},
-			status_code = 400
-		)
+	if card.get("type") == "vcard":
+		try:
+			content = await asyncio.to_thread(normalize_vcard, content if isinstance(content, str) else "", state.settings.vcard_max_bytes)
+		except VCardError as e:
+			return vcard_error_response(e)
 
 	elif card.get("type") == "url" and (
 		not content or not (content.startswith("http://") or content.startswith("https://"))
@@ -546,8 +1343,7 @@ async def create_card(request: Request, card: dict):
 			status_code = 400
 		)
 
-	content = card.get("content")
-	owner = await db["users"].find_one({"_id": card.get("owner_id")})
+	owner = await state.db["users"].find_one({"_id": card.get("owner_id")})
 	if not owner:
 		return JSONResponse(
 			content = {
@@ -556,7 +1352,15 @@ async def create_card(request: Request, card: dict):
 			status_code = 400
 		)
 
+	blob_digests = []
+	if card.get("type") == "vcard":
+		try:
+			content, blob_digests = await store_media(state, content)
+		except VCardError as e:
+			return vcard_error_response(e)
+
 	transaction = card.get("transaction")
+	trans_entry_id = None
 	user_update_ops = {}
 	if isinstance(transaction, dict):
 		trans_entry_id = "".join(random.choices(string.ascii_uppercase + string.digits, k = 12))
@@ -578,6 +1382,8 @@ async def create_card(request: Request, card: dict):
 		"owner_id": card.get("owner_id"),
 		"type": card.get("type"),
 		"content": content,
+		"blobs": blob_digests,
+		"variants": await asyncio.to_thread(vcard_variants, state.settings, content) if card.get("type") == "vcard" else {},
 		"payment_id": trans_entry_id,
 		"organisation": owner.get("organisation", None),
 		"views": 0,
@@ -586,22 +1392,32 @@ async def create_card(request: Request, card: dict):
 		"created_at": str(int(datetime.datetime.now(datetime.timezone.utc).timestamp())),
 		"updated_at": str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
 	}
-	result = await collection.insert_one(payload)
+	payload["search_terms"] = card_search_terms(payload)
+	result = await state.collection.insert_one(payload)
+	record_change(state, "card", "insert", payload["_id"], payload["owner_id"], payload)
 	if user_update_ops:
-		await db["users"].update_one({"_id": card.get("owner_id")}, user_update_ops)
+		await state.db["users"].update_one({"_id": card.get("owner_id")}, user_update_ops)
+		record_change(state, "user", "update", card.get("owner_id"), card.get("owner_id"), user_update_ops["$push"])
 
 	if isinstance(transaction, dict) and isinstance(transaction.get("referral"), str):
 		ref_code = transaction.get("referral").strip().upper()
 		if ref_code:
-			ref_owner = await db["users"].find_one({"referral": ref_code})
-			if ref_owner and ref_owner.get("currency", "MYR") == "MYR":
-				await db["users"].update_one({"_id": ref_owner.get("_id")}, {"$inc": {"referral_reward": 5}})
+			ref_owner = await transition(
+				state.db["users"],
+				{"referral": ref_code, "$or": [{"currency": "MYR"}, {"currency": {"$exists": False}}]},
+				{"$inc": {"referral_reward": 5}},
+				{"referral_reward": 1},
+				sharded = state.settings.mongo_shard_collections
+			)
+			if ref_owner:
+				record_change(state, "user", "update", ref_owner.get("_id"), ref_owner.get("_id"), {"referral_reward": ref_owner.get("referral_reward")})
 	return {"id": str(result.inserted_id)}
 
-@app.patch("/{card_id}")
+@router.patch("/{card_id}")
 async def update_card(request: Request, card_id: str, card: dict):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
-	card_record = await collection.find_one(
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
+	card_record = await state.collection.find_one(
 		{
 			"_id": card_id
 		}
@@ -613,21 +1429,19 @@ async def update_card(request: Request, card_id: str, card: dict):
 			},
 			401
 		)
-	owner = await db["users"].find_one({"_id": card_record.get("owner_id")})
+	owner = await state.db["users"].find_one({"_id": card_record.get("owner_id")})
 	if owner and owner.get("plan_expiry") and int(owner.get("plan_expiry")) < int(datetime.datetime.now(datetime.timezone.utc).timestamp()):
 		return JSONResponse({"error": "plan_expired"}, 403)
 
 	update_fields = {}
 	if card.get("type") == "vcard":
 		content = card.get("content")
-		if not content or not content.startswith("BEGIN:VCARD") or not content.endswith("END:VCARD"):
-			return JSONResponse(
-				content = {
-					"error": "invalid_format"
-				},
-				status_code = 400
-			)
-		update_fields["$set"] = {"content": content}
+		try:
+			content = await asyncio.to_thread(normalize_vcard, content if isinstance(content, str) else "", state.settings.vcard_max_bytes)
+			content, blob_digests = await store_media(state, content)
+		except VCardError as e:
+			return vcard_error_response(e)
+		update_fields["$set"] = {"content": content, "blobs": blob_digests, "variants": await asyncio.to_thread(vcard_variants, state.settings, content)}
 
 	elif card.get("type") == "url":
 		content = card.get("content")
@@ -638,7 +1452,7 @@ async def update_card(request: Request, card_id: str, card: dict):
 				},
 				status_code = 400
 			)
-		update_fields["$set"] = {"content": content}
+		update_fields["$set"] = {"content": content, "blobs": [], "variants": {}}
 
 	else:
 		return JSONResponse(
@@ -650,7 +1464,9 @@ async def update_card(request: Request, card_id: str, card: dict):
 
 	if not update_fields == {}:
 		update_fields["$set"]["updated_at"] = str(int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
-		await collection.update_one({"_id": card_id}, update_fields)
+		await state.collection.update_one({"_id": card_id}, update_fields)
+		await state.code_cache.invalidate(card_id)
+		record_change(state, "card", "update", card_id, card_record.get("owner_id"), update_fields["$set"])
 		return {"status": "success"}
 	else:
 		return JSONResponse(
@@ -660,10 +1476,11 @@ async def update_card(request: Request, card_id: str, card: dict):
 			status_code = 400
 		)
 
-@app.delete("/{card_id}")
+@router.delete("/{card_id}")
 async def delete_card(request: Request, card_id: str):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
-	card_record = await collection.find_one(
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
+	card_record = await state.collection.find_one(
 		{
 			"_id": card_id
 		}
@@ -676,7 +1493,10 @@ async def delete_card(request: Request, card_id: str):
 			401
 		)
 	if auth_user.get("is_admin"):
-		await collection.delete_one({"_id": card_id})
+		await state.collection.delete_one({"_id": card_id})
+		if card_record:
+			await state.code_cache.invalidate(card_record["_id"])
+		record_change(state, "card", "delete", card_id, card_record.get("owner_id") if card_record else None)
 		return {"status": "success"}
 	if not card_record:
 		return JSONResponse(
@@ -693,12 +1513,15 @@ async def delete_card(request: Request, card_id: str):
 			401
 		)
 	else:
-		await collection.delete_one({"_id": card_id})
+		await state.collection.delete_one({"_id": card_id})
+		await state.code_cache.invalidate(card_record["_id"])
+		record_change(state, "card", "delete", card_id, card_record.get("owner_id"))
 		return {"status": "success"}
 
-@app.delete("/{user_id}")
+@router.delete("/{user_id}")
 async def terminate_user(request: Request, user_id: str):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user:
 		return JSONResponse(
 			{
@@ -715,8 +1538,9 @@ async def terminate_user(request: Request, user_id: str):
 		)
 
 	elif auth_user.get("_id") == user_id:
-		await db["users"].delete_one({"_id": user_id})
-		await collection.delete_many({"owner_id": user_id})
+		await state.db["users"].delete_one({"_id": user_id})
+		await state.collection.delete_many({"owner_id": user_id})
+		record_change(state, "user", "delete", user_id, user_id)
 		return JSONResponse(
 			{
 				"status": "success"
@@ -732,9 +1556,11 @@ async def terminate_user(request: Request, user_id: str):
 			401
 		)
 
-@app.post("/renew/user/{user_id}")
+@router.post("/renew/user/{user_id}")
+@idempotent
 async def admin_renew_user_plan(request: Request, user_id: str, data: dict):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user or not auth_user.get("is_admin"):
 		return JSONResponse(
 			{
@@ -777,10 +1603,16 @@ async def admin_renew_user_plan(request: Request, user_id: str, data: dict):
 	if transaction_update:
 		update_ops["$push"] = {"transactions": transaction_update}
 
-	result = await db["users"].update_one({"_id": user_id}, update_ops)
-	if result.matched_count == 0:
+	user_record = await transition(
+		state.db["users"],
+		{"_id": user_id},
+		update_ops,
+		field_projection(("display_name", "email", "plan", "plan_expiry", "username", "organisation", "status", "transactions", "created_at", "updated_at")),
+		sharded = state.settings.mongo_shard_collections
+	)
+	if not user_record:
 		return JSONResponse({"error": "not_found"}, 404)
-	user_record = await db["users"].find_one({"_id": user_id})
+	record_change(state, "user", "update", user_id, user_id, update_ops["$set"])
 	return JSONResponse(
 		content = {
 			"id": user_record.get("_id"),
@@ -798,9 +1630,10 @@ async def admin_renew_user_plan(request: Request, user_id: str, data: dict):
 		status_code = 200
 	)
 
-@app.post("/request")
+@router.post("/request")
 async def data_request(request: Request):
-	auth_user = await db["users"].find_one({"token": request.headers.get("Authorization")})
+	state = request.app.state
+	auth_user = await state.db["users"].find_one({"token": request.headers.get("Authorization")})
 	if not auth_user:
 		return JSONResponse(
 			{
@@ -809,7 +1642,7 @@ async def data_request(request: Request):
 			401
 		)
 	user_cards = []
-	async for card in collection.find({"owner_id": auth_user.get("_id")}):
+	async for card in state.collection.find({"owner_id": auth_user.get("_id")}):
 		user_cards.append(
 			{
 				"id": str(card.get("_id")),
@@ -849,5 +1682,194 @@ async def data_request(request: Request):
 		"cards": user_cards
 	}
 
+# The catch-all tap routes are registered last so they never shadow fixed paths such as /users.
+@router.get("/{card_id}")
+async def read_card(request: Request, card_id: str):
+	state = request.app.state
+	# Hottest route: no body read, one projected lookup, stored bytes straight out.
+	headers = request.headers
+	version = negotiate_vcard_version(headers.get("Accept", ""), headers.get("User-Agent", ""), state.settings.vcard_default_version)
+	variant = VCARD_VARIANTS[version]
+	encoding = negotiate_encoding(headers.get("Accept-Encoding", ""))
+	try:
+		user_card = await state.tap_cards.find_one({"_id": card_id}, TAP_PROJECTIONS[variant, encoding])
+		if user_card and user_card.get("status") == "pending":
+			# A secondary may still show a freshly activated card as pending.
+			user_card = await state.collection.find_one({"_id": card_id}, TAP_PROJECTIONS[variant, encoding])
+	except ServerSelectionTimeoutError:
+		return JSONResponse(
+			content = {
+				"error": "timeout"
+			},
+			status_code = 503
+		)
+	except Exception as e:
+		logger.error("Database error in read_card", exc_info = e)
+		return JSONResponse(
+			content = {
+				"error": "internal"
+			},
+			status_code = 500
+		)
+	if not user_card:
+		return RedirectResponse(url = "https://uwitz.cards")
+	if user_card.get("status") == "pending":
+		return RedirectResponse(url = f"https://portal.uwitz.cards/setup/{card_id}")
+
+	if user_card.get("type") == "vcard":
+		variants = user_card.get("variants") or {}
+		if encoding and variants.get(f"{variant}_{encoding}"):
+			return Response(
+				content = variants[f"{variant}_{encoding}"],
+				media_type = "text/vcard",
+				headers = {
+					"Content-Disposition": "attachment; filename=contact.vcf",
+					"Content-Encoding": encoding,
+					"Vary": "Accept, User-Agent, Accept-Encoding"
+				}
+			)
+		content = variants.get(variant) or transcode_vcard(user_card.get("content") or "", version)
+		if (BLOB_SCHEME.encode() if isinstance(content, bytes) else BLOB_SCHEME) in content:
+			content = content.decode("utf-8") if isinstance(content, bytes) else content
+			# Without a public origin, URIs would carry the bind address or the client's Host header.
+			if state.settings.blob_serve_mode == "inline" or not state.settings.blob_base_url:
+				content = await inline_media(content, state.blob_store)
+			else:
+				content = resolve_media(content, state.settings.blob_base_url)
+		return Response(
+			content = content,
+			media_type = "text/vcard",
+			headers = {
+				"Content-Disposition": "attachment; filename=contact.vcf",
+				"Vary": "Accept, User-Agent, Accept-Encoding"
+			}
+		)
+	elif user_card.get("type") == "url":
+		return RedirectResponse(url = user_card.get("content"))
+	else:
+		return RedirectResponse(url = "https://uwitz.cards")
+
+@router.post("/{card_id}/activate")
+async def activate_card(request: Request, card_id: str, data: dict):
+	"""
+		data: {
+			"pin": "the PIN printed with the card"
+		}
+	"""
+	state = request.app.state
+	pin = data.get("pin")
+	if pin is None or pin == "":
+		return JSONResponse(
+			content = {
+				"error": "pin_missing"
+			},
+			status_code = 400
+		)
+	# The PIN goes into the filter, so anything but a scalar (e.g. {"$ne": null}) would match any PIN.
+	if not isinstance(pin, (str, int)) or isinstance(pin, bool):
+		return JSONResponse(
+			content = {
+				"error": "invalid_pin"
+			},
+			status_code = 400
+		)
+	try:
+		activated = await transition(
+			state.collection,
+			{"_id": card_id, "status": "pending", "pin": pin},
+			{"$set": {"status": "active"}},
+			{"owner_id": 1},
+			sharded = state.settings.mongo_shard_collections
+		)
+	except ServerSelectionTimeoutError:
+		return JSONResponse(
+			content = {
+				"error": "timeout"
+			},
+			status_code = 503
+		)
+	if not activated:
+		return JSONResponse(
+			content = {
+				"error": "invalid_card_pin"
+			},
+			status_code = 401
+		)
+	record_change(state, "card", "update", card_id, activated.get("owner_id"), {"status": "active"})
+	return JSONResponse(
+		content = {
+			"status": "active"
+		}
+	)
+
+FIXED_PATHS = frozenset(route.path for route in router.routes if "{" not in route.path)
+
+def is_tap(scope) -> bool:
+	# Taps read from `tap_cards`, which keeps serving from secondaries during a primary election.
+	return scope["method"] == "GET" and scope["path"].count("/") == 1 and scope["path"] not in FIXED_PATHS
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+	"""Builds the app without touching the network; the database, change stream and workers open in its lifespan."""
+	settings = settings or Settings.from_env()
+	app = FastAPI(lifespan = lifespan)
+	state = app.state
+	state.settings = settings
+	state.slow_queries = SlowQueryListener(
+		settings.slow_query_ms,
+		sink = lambda record: logger.warning("slow_query", extra = {"fields": record})
+	)
+	state.breaker = breaker = CircuitBreaker(
+		threshold = settings.breaker_threshold,
+		window = settings.breaker_window,
+		cooldown = settings.breaker_cooldown
+	)
+	state.code_cache = CodeCache(settings.code_cache_dir, settings.code_workers)
+	state.response_cache = ResponseCache(max_entries = settings.response_cache_entries, max_bytes = settings.response_cache_bytes)
+	state.idempotency = IdempotencyStore(ttl = settings.idempotency_ttl, cache_size = settings.idempotency_cache_size)
+	state.background_tasks = set()
+	app.include_router(router)
+	app.add_middleware(
+		DatabaseGuardMiddleware,
+		breaker = breaker,
+		timeouts = {
+			"/events": None,
+			"/users": settings.listing_timeout,
+			"/cards": settings.listing_timeout,
+			"/search": settings.listing_timeout,
+			"/org": settings.listing_timeout,
+			"/request": settings.listing_timeout,
+			"/blobs": settings.listing_timeout,
+			"/create/users": settings.bulk_timeout,
+			"/codes": settings.listing_timeout
+		},
+		default_timeout = settings.route_timeout,
+		secondary_reads = is_tap
+	)
+	app.add_middleware(
+		CORSMiddleware,
+		allow_origins = settings.cors_origins,
+		allow_credentials = True,
+		allow_methods = ["*"],
+		allow_headers = ["*"]
+	)
+	app.add_middleware(
+		CompressionMiddleware,
+		minimum_size = settings.compress_min_bytes,
+		level = settings.compress_level
+	)
+	app.add_middleware(
+		ProfilingMiddleware,
+		authorize = functools.partial(is_admin_token, state),
+		directory = settings.profile_dir
+	)
+	app.add_middleware(
+		RequestContextMiddleware,
+		logger = logger,
+		sample_rate = settings.access_log_sample_rate
+	)
+	return app
+
+app = create_app()
+
 if __name__ == "__main__":
-	uvicorn.run(app, host = "127.0.0.1", port = 8000)
\ No newline at end of file
+	uvicorn.run(app, host = app.state.settings.host, port = app.state.settings.port)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os
+import io
+import json
+import time
+import pstats
+import asyncio
+import cProfile
+import binascii
+import datetime
+import contextvars
+
+from pymongo import monitoring
+
+try:
+	from pyinstrument import Profiler
+except ImportError:
+	Profiler = None
+
+current_endpoint = contextvars.ContextVar("current_endpoint", default = None)
+
+FILTER_KEYS = {
+	"find": "filter",
+	"count": "query",
+	"distinct": "query",
+	"findAndModify": "query",
+	"aggregate": "pipeline"
+}
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "getMore", "killCursors"}
+
+
+def filter_shape(value):
+	if isinstance(value, dict):
+		return {key: filter_shape(item) for key, item in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [filter_shape(item) for item in value[:5]]
+	return type(value).__name__
+
+
+def command_filter(command_name: str, command: dict):
+	if command_name in FILTER_KEYS:
+		return command.get(FILTER_KEYS[command_name])
+	if command_name == "update":
+		return [update.get("q") for update in command.get("updates", [])[:5]]
+	if command_name == "delete":
+		return [delete.get("q") for delete in command.get("deletes", [])[:5]]
+	return None
+
+
+class SlowQueryListener(monitoring.CommandListener):
+	"""Records MongoDB commands slower than `threshold_ms` with their filter shape and calling endpoint."""
+
+	def __init__(self, threshold_ms: float, sink = None):
+		self.threshold_ms = threshold_ms
+		self.sink = sink or (lambda record: print("Slow query: " + json.dumps(record, default = str)))
+		self._pending = {}
+
+	def started(self, event):
+		if event.command_name in IGNORED_COMMANDS:
+			return
+		# Only references are kept here; the shape is worked out once a command turns out slow.
+		self._pending[(event.connection_id, event.request_id)] = (event.command, current_endpoint.get())
+
+	def succeeded(self, event):
+		self._finish(event, "ok")
+
+	def failed(self, event):
+		self._finish(event, "failed")
+
+	def _finish(self, event, outcome: str):
+		pending = self._pending.pop((event.connection_id, event.request_id), None)
+		if pending is None:
+			return
+		duration_ms = event.duration_micros / 1000
+		if duration_ms < self.threshold_ms:
+			return
+		command, endpoint = pending
+		self.sink(
+			{
+				"command": event.command_name,
+				"collection": command.get(event.command_name),
+				"filter": filter_shape(command_filter(event.command_name, command)),
+				"duration_ms": round(duration_ms, 2),
+				"outcome": outcome,
+				"endpoint": endpoint
+			}
+		)
+
+
+class RequestProfiler:
+	def __init__(self):
+		self._profiler = Profiler(async_mode = "enabled") if Profiler else cProfile.Profile()
+
+	def start(self):
+		if Profiler:
+			self._profiler.start()
+		else:
+			self._profiler.enable()
+
+	def stop(self):
+		if Profiler:
+			self._profiler.stop()
+		else:
+			self._profiler.disable()
+
+	def report(self) -> str:
+		if Profiler:
+			return self._profiler.output_text(unicode = True)
+		buffer = io.StringIO()
+		# cProfile sees the whole event loop, not just this request's task.
+		buffer.write("cProfile fallback: includes work from other requests running concurrently\n\n")
+		pstats.Stats(self._profiler, stream = buffer).sort_stats("cumulative").print_stats(40)
+		return buffer.getvalue()
+
+
+class ProfilingMiddleware:
+	"""
+		Tags every request with its endpoint for the slow-query log, and profiles requests
+		carrying `X-Profile: return` or `X-Profile: store` when `authorize(token)` allows it.
+		One request is profiled at a time; others asking for a profile get 409.
+	"""
+
+	def __init__(self, app, authorize, directory: str = "./profiles"):
+		self.app = app
+		self.authorize = authorize
+		self.directory = directory
+		# Both profilers hook the whole thread, so concurrent sessions would clash or blame each other's work.
+		self._profiling = asyncio.Lock()
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			return await self.app(scope, receive, send)
+		endpoint = current_endpoint.set(f"{scope['method']} {scope['path']}")
+		try:
+			headers = dict(scope.get("headers") or [])
+			mode = headers.get(b"x-profile", b"").decode("latin-1").lower()
+			if mode not in ("return", "store") or not await self.authorize(headers.get(b"authorization", b"").decode("latin-1")):
+				return await self.app(scope, receive, send)
+			if self._profiling.locked():
+				return await self._busy(send)
+			async with self._profiling:
+				await self._profile(mode, scope, receive, send)
+		finally:
+			current_endpoint.reset(endpoint)
+
+	async def _profile(self, mode: str, scope, receive, send):
+		profiler = RequestProfiler()
+		messages = []
+
+		async def capture(message):
+			if mode == "store" and message["type"] == "http.response.start":
+				message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+			if mode == "return":
+				messages.append(message)
+			else:
+				await send(message)
+
+		profile_id = binascii.hexlify(os.urandom(8)).decode()
+		started = time.perf_counter()
+		profiler.start()
+		try:
+			await self.app(scope, receive, capture)
+		finally:
+			profiler.stop()
+		header = f"{scope['method']} {scope['path']} took {(time.perf_counter() - started) * 1000:.1f}ms\n\n"
+		report = header + profiler.report()
+		if mode == "store":
+			await asyncio.to_thread(self._store, profile_id, report)
+			return
+		await send(
+			{
+				"type": "http.response.start",
+				"status": 200,
+				"headers": [(b"content-type", b"text/plain; charset=utf-8")]
+			}
+		)
+		await send({"type": "http.response.body", "body": report.encode()})
+
+	async def _busy(self, send):
+		await send(
+			{
+				"type": "http.response.start",
+				"status": 409,
+				"headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]
+			}
+		)
+		await send({"type": "http.response.body", "body": json.dumps({"error": "profiler_busy"}).encode()})
+
+	def _store(self, profile_id: str, report: str):
+		os.makedirs(self.directory, exist_ok = True)
+		stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+		with open(os.path.join(self.directory, f"{stamp}-{profile_id}.txt"), "w", encoding = "utf-8") as f:
+			f.write(report)
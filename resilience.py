@@ -0,0 +1,174 @@
+import json
+import time
+import asyncio
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+
+class CircuitBreaker:
+	"""Opens after `threshold` database failures inside `window` seconds and fails fast for `cooldown` seconds."""
+
+	def __init__(self, threshold: int = 5, window: float = 10.0, cooldown: float = 5.0):
+		self.threshold = threshold
+		self.window = window
+		self.cooldown = cooldown
+		self.failures = []
+		self.open_until = 0.0
+		self.probing = False
+		# Set by heartbeats while no writable server answers; independent of the failure window.
+		self.unreachable = False
+
+	@property
+	def is_open(self) -> bool:
+		return self.open_until > time.monotonic()
+
+	def allow(self, secondary_ok: bool = False) -> bool:
+		"""`secondary_ok` requests only read from secondaries, so they still run while no primary is reachable."""
+		if self.unreachable and not secondary_ok:
+			return False
+		if self.open_until == 0.0:
+			return True
+		if self.is_open or self.probing:
+			return False
+		# Half-open: let a single request through to test the database.
+		self.probing = True
+		return True
+
+	def record_success(self):
+		self.failures.clear()
+		self.open_until = 0.0
+		self.probing = False
+
+	def record_failure(self):
+		now = time.monotonic()
+		self.failures = [failure for failure in self.failures if now - failure < self.window]
+		self.failures.append(now)
+		self.probing = False
+		if len(self.failures) >= self.threshold or self.open_until:
+			self.trip()
+
+	def release(self):
+		"""Frees the half-open probe slot after a request that said nothing about the database."""
+		self.probing = False
+
+	def trip(self):
+		self.open_until = time.monotonic() + self.cooldown
+		self.probing = False
+
+
+class BreakerHeartbeatListener(monitoring.ServerHeartbeatListener):
+	"""
+		Keeps the latest heartbeat per server address and marks the breaker unreachable only while
+		no server accepts writes and at least one has failed, so a lost secondary never flips the API.
+	"""
+
+	def __init__(self, breaker: CircuitBreaker):
+		self.breaker = breaker
+		self.servers = {}
+
+	def started(self, event):
+		pass
+
+	def succeeded(self, event):
+		self.servers[event.connection_id] = event.reply.is_writable
+		self._update()
+
+	def failed(self, event):
+		self.servers[event.connection_id] = None
+		self._update()
+
+	def _update(self):
+		states = self.servers.values()
+		self.breaker.unreachable = not any(states) and None in states
+
+
+class DatabaseGuardMiddleware:
+	"""
+		Bounds every request by a per-route timeout and rejects requests with 503 while the
+		circuit breaker is open, so worker slots are not held by a database that is down.
+	"""
+
+	def __init__(self, app, breaker: CircuitBreaker, timeouts: dict, default_timeout: float, exempt: tuple = ("/",), secondary_reads = None):
+		self.app = app
+		self.breaker = breaker
+		self.timeouts = timeouts
+		self.default_timeout = default_timeout
+		self.exempt = exempt
+		self.secondary_reads = secondary_reads or (lambda scope: False)
+
+	def timeout_for(self, path: str) -> float | None:
+		for prefix, timeout in self.timeouts.items():
+			if path == prefix or path.startswith(prefix + "/"):
+				return timeout
+		return self.default_timeout
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http" or scope["path"] in self.exempt:
+			return await self.app(scope, receive, send)
+		if not self.breaker.allow(self.secondary_reads(scope)):
+			return await self._unavailable(send, int(self.breaker.cooldown))
+		outcome = {}
+		started = asyncio.Event()
+
+		def record(failed: bool | None):
+			# The outcome is settled once, when the response starts, so a long-lived stream such as
+			# SSE never holds the half-open probe slot; None only releases the slot.
+			if "failed" in outcome:
+				return
+			outcome["failed"] = failed
+			if failed:
+				self.breaker.record_failure()
+			elif failed is None:
+				self.breaker.release()
+			else:
+				self.breaker.record_success()
+
+		async def tracked_send(message):
+			if message["type"] == "http.response.start":
+				# Handlers answer 503 when they catch ServerSelectionTimeoutError.
+				record(message["status"] == 503)
+				started.set()
+			await send(message)
+
+		timeout = self.timeout_for(scope["path"])
+		handler = asyncio.ensure_future(self.app(scope, receive, tracked_send))
+		try:
+			if timeout is not None:
+				# Only the work before the response starts is timed: a slow client reading a large
+				# body says nothing about the database.
+				response_started = asyncio.ensure_future(started.wait())
+				try:
+					await asyncio.wait({handler, response_started}, timeout = timeout, return_when = asyncio.FIRST_COMPLETED)
+				finally:
+					response_started.cancel()
+				if not handler.done() and not started.is_set():
+					handler.cancel()
+					await asyncio.wait({handler})
+					if not handler.cancelled():
+						handler.exception()
+					record(True)
+					return await self._unavailable(send)
+			await handler
+		except PyMongoError:
+			record(True)
+			raise
+		except asyncio.CancelledError:
+			handler.cancel()
+			raise
+		finally:
+			# Other exceptions and cancellation are not database failures, but must not keep the probe slot.
+			record(None)
+
+	async def _unavailable(self, send, retry_after: int | None = None):
+		headers = [(b"content-type", b"application/json")]
+		if retry_after:
+			headers.append((b"retry-after", str(retry_after).encode()))
+		await send(
+			{
+				"type": "http.response.start",
+				"status": 503,
+				"headers": headers
+			}
+		)
+		await send({"type": "http.response.body", "body": json.dumps({"error": "timeout"}).encode()})
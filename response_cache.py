@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+
+class ResponseCache:
+	"""
+		Rendered responses keyed by endpoint and principal, each tagged with the owners it depends on.
+
+		Every write bumps a sequence number and records it against the owners it touched, so invalidating
+		all of an owner's entries is O(1). An entry is served only if none of its owners changed after the
+		entry's stamp, which is taken before the database reads that produced it.
+	"""
+
+	def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024, max_owners: int = 100000):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.max_owners = max_owners
+		self.sequence = 0
+		# Anything stamped before `floor` is stale: set by global bumps and by forgetting old owner bumps.
+		self.floor = 0
+		self._bumped = OrderedDict()
+		self._entries = OrderedDict()
+		self._bytes = 0
+
+	def stamp(self) -> int:
+		return self.sequence
+
+	def bump(self, owner_id = None):
+		"""Marks `owner_id`'s entries stale, or every entry when the owner is unknown."""
+		self.sequence += 1
+		if owner_id is None:
+			self.floor = self.sequence
+			return
+		self._bumped[owner_id] = self.sequence
+		self._bumped.move_to_end(owner_id)
+		while len(self._bumped) > self.max_owners:
+			_, sequence = self._bumped.popitem(last = False)
+			self.floor = max(self.floor, sequence)
+
+	def _fresh(self, stamp: int, owners: tuple) -> bool:
+		if stamp < self.floor:
+			return False
+		return all(self._bumped.get(owner, 0) <= stamp for owner in owners)
+
+	def get(self, key: tuple) -> Response | None:
+		entry = self._entries.get(key)
+		if entry is None:
+			return None
+		stamp, owners, status_code, media_type, body = entry
+		if not self._fresh(stamp, owners):
+			self._drop(key)
+			return None
+		self._entries.move_to_end(key)
+		return Response(content = body, status_code = status_code, media_type = media_type)
+
+	def put(self, key: tuple, stamp: int, owners: tuple, response: Response):
+		owners = tuple(owner for owner in owners if owner is not None)
+		body = bytes(response.body)
+		if not self._fresh(stamp, owners) or len(body) > self.max_bytes:
+			return
+		self._drop(key)
+		self._entries[key] = (stamp, owners, response.status_code, response.media_type, body)
+		self._bytes += len(body)
+		while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+			self._drop(next(iter(self._entries)))
+
+	def _drop(self, key: tuple):
+		entry = self._entries.pop(key, None)
+		if entry is not None:
+			self._bytes -= len(entry[4])
+
+	def clear(self):
+		self._entries.clear()
+		self._bytes = 0
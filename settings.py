@@ -0,0 +1,150 @@
+import os
+
+from dataclasses import dataclass, field
+from urllib.parse import quote_plus
+
+
+def env_float(name: str, default: str) -> float | None:
+	value = os.getenv(name, default)
+	return float(value) if value else None
+
+
+@dataclass
+class Settings:
+	"""
+		Everything the app needs to open its resources. Nothing here touches the network or disk;
+		`create_app` only reads it, and the lifespan uses it to connect.
+	"""
+
+	mongo_url: str | None = None
+	mongo_database: str = "cards"
+	mongo_tls: bool = True
+	mongo_tls_cert_file: str = "./certs/mongo.pem"
+	mongo_tls_ca_file: str = "./certs/ca.crt"
+	mongo_max_pool_size: int = 100
+	mongo_min_pool_size: int = 10
+	mongo_max_idle_ms: int = 300000
+	mongo_server_selection_timeout_ms: int = 2000
+	mongo_connect_timeout_ms: int = 2000
+	mongo_socket_timeout_ms: int = 10000
+	mongo_warmup_timeout: float = 5.0
+	mongo_shard_collections: bool = False
+	prepare_database: bool = True
+	# Anonymous taps and admin listings tolerate bounded staleness and go to secondaries.
+	tap_read_preference: str = "nearest"
+	tap_max_staleness: int = 90
+	tap_read_concern: str = "local"
+	listing_read_preference: str = "secondaryPreferred"
+	listing_max_staleness: int = 90
+	listing_read_concern: str = "local"
+
+	slow_query_ms: float = 100.0
+	breaker_threshold: int = 5
+	breaker_window: float = 10.0
+	breaker_cooldown: float = 5.0
+	route_timeout: float | None = 3.0
+	listing_timeout: float | None = 10.0
+	bulk_timeout: float | None = 120.0
+
+	events_queue_size: int = 256
+	events_heartbeat: float = 15.0
+	blob_backend: str = "gridfs"
+	blob_dir: str = "./blobs"
+	blob_min_bytes: int = 4096
+	blob_serve_mode: str = "uri"
+	blob_base_url: str | None = None
+	# Public origin printed into QR codes and NFC tags; codes are refused while it is unset.
+	tap_base_url: str | None = None
+	code_cache_dir: str = "./codes"
+	code_workers: int | None = None
+	codes_batch_limit: int = 500
+
+	vcard_default_version: str = "4.0"
+	vcard_max_bytes: int = 2097152
+	vcard_max_stored_bytes: int = 65536
+	search_candidates: int = 200
+	create_users_batch: int = 500
+	idempotency_ttl: int = 86400
+	idempotency_cache_size: int = 10000
+	response_cache_entries: int = 5000
+	response_cache_bytes: int = 67108864
+
+	log_level: str = "INFO"
+	log_queue_size: int = 10000
+	access_log_sample_rate: float = 0.01
+	profile_dir: str = "./profiles"
+	compress_min_bytes: int = 1024
+	compress_level: int = 5
+	cors_origins: list = field(default_factory = lambda: ["https://portal.uwitz.cards"])
+
+	host: str = "127.0.0.1"
+	port: int = 8000
+
+	def __post_init__(self):
+		# Blob URIs go out on the same public origin as taps unless told otherwise.
+		if self.blob_base_url is None:
+			self.blob_base_url = self.tap_base_url
+
+	@classmethod
+	def from_env(cls) -> "Settings":
+		url = os.getenv("MONGO_URL")
+		if not url and os.getenv("MONGO_HOST"):
+			url = f"mongodb://{quote_plus(os.getenv('MONGO_USER', ''))}:{quote_plus(os.getenv('MONGO_PASS', ''))}@{quote_plus(os.getenv('MONGO_HOST'))}"
+		return cls(
+			mongo_url = url,
+			mongo_database = os.getenv("MONGO_DATABASE", "cards"),
+			mongo_tls = os.getenv("MONGO_TLS", "1") == "1",
+			mongo_tls_cert_file = os.getenv("MONGO_TLS_CERT_FILE", "./certs/mongo.pem"),
+			mongo_tls_ca_file = os.getenv("MONGO_TLS_CA_FILE", "./certs/ca.crt"),
+			mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+			mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+			mongo_max_idle_ms = int(os.getenv("MONGO_MAX_IDLE_MS", "300000")),
+			mongo_server_selection_timeout_ms = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000")),
+			mongo_connect_timeout_ms = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "2000")),
+			mongo_socket_timeout_ms = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+			mongo_warmup_timeout = float(os.getenv("MONGO_WARMUP_TIMEOUT", "5")),
+			mongo_shard_collections = os.getenv("MONGO_SHARD_COLLECTIONS") == "1",
+			prepare_database = os.getenv("PREPARE_DATABASE", "1") == "1",
+			tap_read_preference = os.getenv("MONGO_TAP_READ_PREFERENCE", "nearest"),
+			tap_max_staleness = int(os.getenv("MONGO_TAP_MAX_STALENESS", "90")),
+			tap_read_concern = os.getenv("MONGO_TAP_READ_CONCERN", "local"),
+			listing_read_preference = os.getenv("MONGO_LISTING_READ_PREFERENCE", "secondaryPreferred"),
+			listing_max_staleness = int(os.getenv("MONGO_LISTING_MAX_STALENESS", "90")),
+			listing_read_concern = os.getenv("MONGO_LISTING_READ_CONCERN", "local"),
+			slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100")),
+			breaker_threshold = int(os.getenv("BREAKER_THRESHOLD", "5")),
+			breaker_window = float(os.getenv("BREAKER_WINDOW", "10")),
+			breaker_cooldown = float(os.getenv("BREAKER_COOLDOWN", "5")),
+			route_timeout = env_float("ROUTE_TIMEOUT", "3"),
+			listing_timeout = env_float("LISTING_TIMEOUT", "10"),
+			bulk_timeout = env_float("BULK_TIMEOUT", "120"),
+			events_queue_size = int(os.getenv("EVENTS_QUEUE_SIZE", "256")),
+			events_heartbeat = float(os.getenv("EVENTS_HEARTBEAT", "15")),
+			blob_backend = os.getenv("BLOB_BACKEND", "gridfs"),
+			blob_dir = os.getenv("BLOB_DIR", "./blobs"),
+			blob_min_bytes = int(os.getenv("BLOB_MIN_BYTES", "4096")),
+			blob_serve_mode = os.getenv("BLOB_SERVE_MODE", "uri"),
+			blob_base_url = os.getenv("BLOB_BASE_URL"),
+			tap_base_url = os.getenv("TAP_BASE_URL"),
+			code_cache_dir = os.getenv("CODE_CACHE_DIR", "./codes"),
+			code_workers = int(os.getenv("CODE_WORKERS", "0")) or None,
+			codes_batch_limit = int(os.getenv("CODES_BATCH_LIMIT", "500")),
+			vcard_default_version = os.getenv("VCARD_DEFAULT_VERSION", "4.0"),
+			vcard_max_bytes = int(os.getenv("VCARD_MAX_BYTES", "2097152")),
+			vcard_max_stored_bytes = int(os.getenv("VCARD_MAX_STORED_BYTES", "65536")),
+			search_candidates = int(os.getenv("SEARCH_CANDIDATES", "200")),
+			create_users_batch = int(os.getenv("CREATE_USERS_BATCH", "500")),
+			idempotency_ttl = int(os.getenv("IDEMPOTENCY_TTL", "86400")),
+			idempotency_cache_size = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+			response_cache_entries = int(os.getenv("RESPONSE_CACHE_ENTRIES", "5000")),
+			response_cache_bytes = int(os.getenv("RESPONSE_CACHE_BYTES", "67108864")),
+			log_level = os.getenv("LOG_LEVEL", "INFO"),
+			log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+			access_log_sample_rate = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.01")),
+			profile_dir = os.getenv("PROFILE_DIR", "./profiles"),
+			compress_min_bytes = int(os.getenv("COMPRESS_MIN_BYTES", "1024")),
+			compress_level = int(os.getenv("COMPRESS_LEVEL", "5")),
+			cors_origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "https://portal.uwitz.cards").split(",") if origin.strip()],
+			host = os.getenv("HOST", "127.0.0.1"),
+			port = int(os.getenv("PORT", "8000"))
+		)
@@ -0,0 +1,59 @@
+import os
+import sys
+import uuid
+import socket
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+@pytest.fixture
+def mongo_url():
+	url = os.getenv("MONGO_TEST_URL")
+	if not url:
+		pytest.skip("MONGO_TEST_URL is not set")
+	return url
+
+
+@pytest.fixture
+def database(mongo_url):
+	pymongo = pytest.importorskip("pymongo")
+	client = pymongo.MongoClient(mongo_url, serverSelectionTimeoutMS = 2000)
+	name = f"cards_test_{uuid.uuid4().hex[:12]}"
+	yield client[name]
+	client.drop_database(name)
+	client.close()
+
+
+@pytest.fixture
+def serve():
+	"""Runs an app under a real uvicorn server on a free port and yields its base URL."""
+	uvicorn = pytest.importorskip("uvicorn")
+	servers = []
+
+	def start(app) -> str:
+		port = free_port()
+		server = uvicorn.Server(uvicorn.Config(app, host = "127.0.0.1", port = port, log_level = "warning"))
+		thread = threading.Thread(target = server.run, daemon = True)
+		thread.start()
+		deadline = time.monotonic() + 10
+		while not server.started:
+			if time.monotonic() > deadline or not thread.is_alive():
+				pytest.fail("uvicorn did not start")
+			time.sleep(0.05)
+		servers.append((server, thread))
+		return f"http://127.0.0.1:{port}"
+
+	yield start
+	for server, thread in servers:
+		server.should_exit = True
+		thread.join(10)
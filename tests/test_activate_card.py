@@ -0,0 +1,30 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from main import activate_card
+
+
+class UntouchableCollection:
+	def __getattr__(self, name):
+		raise AssertionError(f"collection.{name} must not be reached")
+
+
+def fake_request():
+	return types.SimpleNamespace(app = types.SimpleNamespace(state = types.SimpleNamespace(collection = UntouchableCollection())))
+
+
+@pytest.mark.parametrize("pin", [{"$ne": None}, {"$gt": ""}, ["1234"], True, 12.5])
+def test_non_scalar_pins_are_rejected_before_the_query(pin):
+	response = asyncio.run(activate_card(fake_request(), "card1", {"pin": pin}))
+	assert response.status_code == 400
+	assert response.body == b'{"error":"invalid_pin"}'
+
+
+def test_missing_pin_is_rejected():
+	response = asyncio.run(activate_card(fake_request(), "card1", {}))
+	assert response.status_code == 400
+	assert response.body == b'{"error":"pin_missing"}'
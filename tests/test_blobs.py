@@ -0,0 +1,44 @@
+import base64
+import hashlib
+
+from blobs import BLOB_SCHEME, blob_references, extract_media, resolve_media
+
+PHOTO = bytes(range(256)) * 32
+DIGEST = hashlib.sha256(PHOTO).hexdigest()
+CARD = (
+	"BEGIN:VCARD\r\nVERSION:4.0\r\nFN:Jane Doe\r\n"
+	f"PHOTO:data:image/jpeg;base64,{base64.b64encode(PHOTO).decode()}\r\n"
+	"END:VCARD\r\n"
+)
+
+
+def test_extract_media_moves_large_photos_out():
+	slim, blobs = extract_media(CARD, 4096)
+	assert blobs == {DIGEST: (PHOTO, "image/jpeg")}
+	assert f"PHOTO;MEDIATYPE=image/jpeg:{BLOB_SCHEME}{DIGEST}" in slim.replace("\r\n ", "")
+
+
+def test_small_media_stays_inline():
+	slim, blobs = extract_media(CARD, len(PHOTO) + 1)
+	assert blobs == {}
+	assert BLOB_SCHEME not in slim
+
+
+def test_blob_references_survive_a_round_trip_of_slim_content():
+	slim, _ = extract_media(CARD, 4096)
+	# Content echoed back by the portal has nothing left to extract, but still references the blob.
+	again, blobs = extract_media(slim, 4096)
+	assert blobs == {}
+	assert blob_references(again) == [DIGEST]
+
+
+def test_blob_references_ignore_non_media_properties():
+	text = f"BEGIN:VCARD\r\nVERSION:4.0\r\nNOTE:{BLOB_SCHEME}{DIGEST}\r\nEND:VCARD\r\n"
+	assert blob_references(text) == []
+
+
+def test_resolve_media_points_at_the_blob_route():
+	slim, _ = extract_media(CARD, 4096)
+	resolved = resolve_media(slim, "https://uwitz.cards/")
+	assert BLOB_SCHEME not in resolved
+	assert f"https://uwitz.cards/blobs/{DIGEST}" in resolved.replace("\r\n ", "")
@@ -0,0 +1,26 @@
+import gzip
+
+from compression import compress, negotiate_encoding, precompressed
+
+
+def test_picks_the_highest_q_available_encoding():
+	assert negotiate_encoding("gzip;q=0.5, br;q=0.8", ("br", "gzip")) == "br"
+	assert negotiate_encoding("gzip;q=0.9, br;q=0.8", ("br", "gzip")) == "gzip"
+
+
+def test_ties_prefer_earlier_available_encodings():
+	assert negotiate_encoding("gzip, br", ("br", "gzip")) == "br"
+
+
+def test_wildcard_and_refusals():
+	assert negotiate_encoding("*", ("br", "gzip")) == "br"
+	assert negotiate_encoding("*, br;q=0", ("br", "gzip")) == "gzip"
+	assert negotiate_encoding("identity", ("br", "gzip")) is None
+	assert negotiate_encoding("", ("gzip",)) is None
+	assert negotiate_encoding("gzip;q=bogus", ("gzip",)) is None
+
+
+def test_gzip_output_is_deterministic():
+	data = b"BEGIN:VCARD\r\n" * 100
+	assert compress(data, "gzip") == compress(data, "gzip")
+	assert gzip.decompress(precompressed(data)["gzip"]) == data
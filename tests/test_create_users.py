@@ -0,0 +1,51 @@
+import json
+import urllib.request
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from main import create_app
+from settings import Settings
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+def test_ndjson_bulk_create_over_a_real_server(database, mongo_url, serve):
+	database["admin"].insert_one({"token": ADMIN_TOKEN})
+	base_url = serve(
+		create_app(
+			Settings(
+				tap_base_url = "https://uwitz.cards",
+				mongo_url = mongo_url,
+				mongo_database = database.name,
+				mongo_tls = False,
+				mongo_min_pool_size = 1,
+				prepare_database = False
+			)
+		)
+	)
+	body = "\n".join(
+		[
+			json.dumps({"username": "ndjson_one", "email": "one@example.com"}),
+			"{not json",
+			json.dumps({"username": "ndjson_two", "email": "two@example.com"}),
+			json.dumps({"username": "ndjson_one", "email": "again@example.com"})
+		]
+	).encode()
+	request = urllib.request.Request(
+		f"{base_url}/create/users",
+		data = body,
+		headers = {"Authorization": ADMIN_TOKEN, "Content-Type": "application/x-ndjson"},
+		method = "POST"
+	)
+	with urllib.request.urlopen(request, timeout = 15) as response:
+		results = [json.loads(line) for line in response.read().decode().splitlines()]
+
+	assert sorted(result["row"] for result in results) == [0, 1, 2, 3]
+	by_row = {result["row"]: result for result in results}
+	assert by_row[0]["status"] == "created"
+	assert by_row[1]["error"] == "invalid_json"
+	assert by_row[2]["status"] == "created"
+	assert by_row[3]["error"] == "duplicate_username"
+	assert database["users"].count_documents({"username": {"$in": ["ndjson_one", "ndjson_two"]}}) == 2
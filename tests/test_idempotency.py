@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+from idempotency import IdempotencyStore
+
+
+def matches(document: dict, query: dict) -> bool:
+	for key, condition in query.items():
+		value = document.get(key)
+		if isinstance(condition, dict) and "$lt" in condition:
+			if value is None or not value < condition["$lt"]:
+				return False
+		elif value != condition:
+			return False
+	return True
+
+
+class MemoryRecords:
+	"""The handful of collection methods the store uses, over a dict."""
+
+	def __init__(self):
+		self.documents = {}
+
+	async def insert_one(self, document: dict):
+		if document["_id"] in self.documents:
+			raise DuplicateKeyError("duplicate")
+		self.documents[document["_id"]] = dict(document)
+
+	async def find_one(self, query: dict):
+		return next((dict(document) for document in self.documents.values() if matches(document, query)), None)
+
+	async def find_one_and_update(self, query: dict, update: dict):
+		document = await self.find_one(query)
+		if document:
+			self.documents[document["_id"]].update(update["$set"])
+		return document
+
+	async def update_one(self, query: dict, update: dict):
+		await self.find_one_and_update(query, update)
+
+	async def delete_one(self, query: dict):
+		document = await self.find_one(query)
+		if document:
+			del self.documents[document["_id"]]
+
+
+def store() -> IdempotencyStore:
+	idempotency = IdempotencyStore(ttl = 3600, pending_ttl = 60)
+	idempotency.bind(MemoryRecords())
+	return idempotency
+
+
+def test_retry_replays_the_first_response():
+	idempotency = store()
+	calls = []
+
+	async def handler():
+		calls.append(1)
+		return JSONResponse({"id": len(calls)}, status_code = 201)
+
+	async def scenario():
+		first = await idempotency.run("scope", "fp", handler)
+		idempotency._cache.clear()
+		second = await idempotency.run("scope", "fp", handler)
+		return first, second
+
+	first, second = asyncio.run(scenario())
+	assert calls == [1]
+	assert second.status_code == 201 and second.body == first.body
+	assert second.headers["Idempotent-Replayed"] == "true"
+
+
+def test_reused_key_with_a_different_payload_is_rejected():
+	idempotency = store()
+
+	async def handler():
+		return {"ok": True}
+
+	async def scenario():
+		await idempotency.run("scope", "fp", handler)
+		return await idempotency.run("scope", "other", handler)
+
+	assert asyncio.run(scenario()).status_code == 422
+
+
+def test_failed_handler_leaves_the_key_in_doubt_past_the_pending_deadline():
+	idempotency = store()
+	calls = []
+
+	async def crashing():
+		calls.append(1)
+		raise asyncio.CancelledError()
+
+	async def scenario():
+		with pytest.raises(asyncio.CancelledError):
+			await idempotency.run("scope", "fp", crashing)
+		record = idempotency.records.documents["scope"]
+		assert record["status"] == "in_doubt"
+		assert record["expires_at"] > datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds = 3000)
+		# Even once the pending deadline has passed, a retry must not run the handler again.
+		record["expires_at"] = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds = 1)
+		return await idempotency.run("scope", "fp", crashing)
+
+	response = asyncio.run(scenario())
+	assert response.status_code == 409
+	assert response.body == b'{"error":"request_in_doubt"}'
+	assert calls == [1]
+
+
+def test_abandoned_pending_record_is_taken_over():
+	idempotency = store()
+
+	async def handler():
+		return {"ok": True}
+
+	async def scenario():
+		await idempotency.records.insert_one(
+			{"_id": "scope", "fingerprint": "fp", "status": "pending", "expires_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds = 1)}
+		)
+		return await idempotency.run("scope", "fp", handler)
+
+	assert asyncio.run(scenario()).status_code == 200
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from monitoring import ProfilingMiddleware
+
+
+def test_concurrent_profiles_are_refused_instead_of_clashing():
+	release = asyncio.Event()
+
+	async def app(scope, receive, send):
+		await release.wait()
+		await send({"type": "http.response.start", "status": 200, "headers": []})
+		await send({"type": "http.response.body", "body": b"ok"})
+
+	async def authorize(token):
+		return token == "admin"
+
+	middleware = ProfilingMiddleware(app, authorize = authorize)
+	scope = {"type": "http", "method": "GET", "path": "/cards", "headers": [(b"x-profile", b"return"), (b"authorization", b"admin")]}
+
+	async def request():
+		sent = []
+
+		async def send(message):
+			sent.append(message)
+
+		await middleware(scope, None, send)
+		return sent
+
+	async def scenario():
+		first = asyncio.ensure_future(request())
+		await asyncio.sleep(0.01)
+		second = await request()
+		release.set()
+		return await first, second
+
+	first, second = asyncio.run(scenario())
+	assert second[0]["status"] == 409
+	assert first[0]["status"] == 200
+	assert b"/cards took" in first[1]["body"]
@@ -0,0 +1,124 @@
+import os
+import json
+import uuid
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip("fastapi")
+pymongo = pytest.importorskip("pymongo")
+
+from pymongo import monitoring
+from pymongo.write_concern import WriteConcern
+
+from main import create_app
+from settings import Settings
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+class CommandRecorder(monitoring.CommandListener):
+	def __init__(self):
+		self.commands = []
+
+	def started(self, event):
+		self.commands.append((event.command_name, event.command.get(event.command_name), event.connection_id))
+
+	def succeeded(self, event):
+		pass
+
+	def failed(self, event):
+		pass
+
+	def finds(self, collection: str) -> list:
+		return [address for name, target, address in self.commands if name == "find" and target == collection]
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+	def redirect_request(self, *args, **kwargs):
+		return None
+
+
+def fetch(url: str, data: dict | None = None, token: str | None = None):
+	request = urllib.request.Request(
+		url,
+		data = json.dumps(data).encode() if data is not None else None,
+		headers = {"Content-Type": "application/json", **({"Authorization": token} if token else {})},
+		method = "POST" if data is not None else "GET"
+	)
+	try:
+		return urllib.request.build_opener(NoRedirect).open(request, timeout = 15)
+	except urllib.error.HTTPError as e:
+		return e
+
+
+@pytest.fixture
+def replica_set():
+	"""Yields (url, client, database) for a replica set with at least one secondary."""
+	url = os.getenv("MONGO_TEST_REPLSET_URL")
+	if not url:
+		pytest.skip("MONGO_TEST_REPLSET_URL is not set")
+	client = pymongo.MongoClient(url, serverSelectionTimeoutMS = 5000)
+	client.admin.command("ping")
+	if not client.secondaries:
+		client.close()
+		pytest.skip("replica set has no secondary")
+	name = f"cards_test_{uuid.uuid4().hex[:12]}"
+	# Seed on every member so secondary reads see the fixtures.
+	database = client.get_database(name, write_concern = WriteConcern(w = 1 + len(client.secondaries)))
+	yield url, client, database
+	client.drop_database(name)
+	client.close()
+
+
+@pytest.fixture
+def running(replica_set, serve):
+	url, client, database = replica_set
+	database["users"].insert_one({"_id": "admin", "token": ADMIN_TOKEN, "is_admin": True, "username": "admin"})
+	app = create_app(
+		Settings(
+			tap_base_url = "https://uwitz.cards",
+			mongo_url = url,
+			mongo_database = database.name,
+			mongo_tls = False,
+			mongo_min_pool_size = 1,
+			prepare_database = False,
+			tap_read_preference = "secondary"
+		)
+	)
+	recorder = app.state.slow_queries = CommandRecorder()
+	return serve(app), recorder, client, database
+
+
+def test_taps_and_listings_read_from_secondaries(running):
+	base_url, recorder, client, database = running
+	database["user_cards"].insert_one({"_id": "tapcard1", "type": "url", "content": "https://example.com/tap", "status": "active", "owner_id": "admin"})
+
+	response = fetch(f"{base_url}/tapcard1")
+	assert response.status == 307
+	assert response.headers["Location"] == "https://example.com/tap"
+	assert fetch(f"{base_url}/users", token = ADMIN_TOKEN).status == 200
+
+	primary = client.primary
+	assert recorder.finds("user_cards") and all(address != primary for address in recorder.finds("user_cards"))
+	# The admin token lookup stays on the primary; the listing itself goes to a secondary.
+	user_finds = recorder.finds("users")
+	assert user_finds[0] == primary
+	assert any(address != primary for address in user_finds[1:])
+
+
+def test_pending_card_is_re_read_from_the_primary(running):
+	base_url, recorder, client, database = running
+	database["user_cards"].insert_one({"_id": "pending1", "type": "url", "content": "https://example.com/pending", "status": "pending", "pin": "1234", "owner_id": "admin"})
+
+	response = fetch(f"{base_url}/pending1")
+	assert response.headers["Location"] == "https://portal.uwitz.cards/setup/pending1"
+	primary = client.primary
+	finds = recorder.finds("user_cards")
+	assert finds[0] != primary and finds[-1] == primary
+
+	assert fetch(f"{base_url}/pending1/activate", {"pin": "1234"}).status == 200
+	# Read straight after activation: a lagging secondary still says pending, the primary does not.
+	response = fetch(f"{base_url}/pending1")
+	assert response.headers["Location"] == "https://example.com/pending"
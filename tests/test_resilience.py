@@ -0,0 +1,198 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+from resilience import BreakerHeartbeatListener, CircuitBreaker, DatabaseGuardMiddleware
+
+
+def half_open_breaker() -> CircuitBreaker:
+	# A zero cooldown puts a tripped breaker straight into half-open.
+	breaker = CircuitBreaker(threshold = 1, cooldown = 0)
+	breaker.record_failure()
+	return breaker
+
+
+def test_opens_after_threshold_failures_in_window():
+	breaker = CircuitBreaker(threshold = 3, window = 60, cooldown = 60)
+	breaker.record_failure()
+	breaker.record_failure()
+	assert breaker.allow()
+	breaker.record_failure()
+	assert breaker.is_open
+	assert not breaker.allow()
+
+
+def test_success_clears_failures():
+	breaker = CircuitBreaker(threshold = 2, window = 60, cooldown = 60)
+	breaker.record_failure()
+	breaker.record_success()
+	breaker.record_failure()
+	assert breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+	breaker = half_open_breaker()
+	assert breaker.allow()
+	assert not breaker.allow()
+	breaker.record_success()
+	assert breaker.allow()
+	assert breaker.allow()
+
+
+def test_failed_probe_trips_again():
+	breaker = half_open_breaker()
+	breaker.cooldown = 60
+	assert breaker.allow()
+	breaker.record_failure()
+	assert breaker.is_open
+	assert not breaker.allow()
+
+
+def test_release_frees_the_probe_slot_without_closing():
+	breaker = half_open_breaker()
+	assert breaker.allow()
+	breaker.release()
+	assert breaker.allow()
+	assert not breaker.allow()
+
+
+def test_unreachable_blocks_all_but_secondary_reads():
+	breaker = CircuitBreaker()
+	breaker.unreachable = True
+	assert not breaker.allow()
+	assert breaker.allow(secondary_ok = True)
+
+
+def heartbeat(address, writable = None):
+	return types.SimpleNamespace(connection_id = address, reply = types.SimpleNamespace(is_writable = writable))
+
+
+def test_lost_secondary_does_not_mark_unreachable():
+	breaker = CircuitBreaker()
+	listener = BreakerHeartbeatListener(breaker)
+	listener.succeeded(heartbeat(("a", 1), True))
+	listener.succeeded(heartbeat(("b", 1), False))
+	listener.failed(heartbeat(("c", 1)))
+	assert not breaker.unreachable
+	listener.succeeded(heartbeat(("b", 1), False))
+	assert not breaker.unreachable
+
+
+def test_unreachable_only_without_a_writable_server():
+	breaker = CircuitBreaker()
+	listener = BreakerHeartbeatListener(breaker)
+	listener.succeeded(heartbeat(("a", 1), True))
+	listener.failed(heartbeat(("a", 1)))
+	listener.succeeded(heartbeat(("b", 1), False))
+	assert breaker.unreachable
+	listener.succeeded(heartbeat(("a", 1), True))
+	assert not breaker.unreachable
+
+
+def test_heartbeat_does_not_close_a_breaker_opened_by_failures():
+	breaker = CircuitBreaker(threshold = 1, cooldown = 60)
+	breaker.record_failure()
+	BreakerHeartbeatListener(breaker).succeeded(heartbeat(("a", 1), True))
+	assert not breaker.allow()
+
+
+def run(middleware, path = "/card", method = "GET"):
+	sent = []
+
+	async def send(message):
+		sent.append(message)
+
+	async def receive():
+		return {"type": "http.request", "body": b"", "more_body": False}
+
+	async def call():
+		await middleware({"type": "http", "path": path, "method": method}, receive, send)
+
+	return asyncio.run(call()), sent
+
+
+def responding(status = 200, then = None):
+	async def app(scope, receive, send):
+		await send({"type": "http.response.start", "status": status, "headers": []})
+		if then:
+			await then()
+		await send({"type": "http.response.body", "body": b"ok"})
+	return app
+
+
+def raising(error):
+	async def app(scope, receive, send):
+		raise error
+	return app
+
+
+def sleeping(scope, receive, send):
+	return asyncio.sleep(10)
+
+
+def guard(app, breaker, timeout = 1.0, **kwargs):
+	return DatabaseGuardMiddleware(app, breaker = breaker, timeouts = {}, default_timeout = timeout, **kwargs)
+
+
+def test_probe_success_closes_the_breaker():
+	breaker = half_open_breaker()
+	run(guard(responding(), breaker))
+	assert breaker.open_until == 0.0
+	assert breaker.allow()
+
+
+def test_probe_timeout_records_failure_and_frees_the_slot():
+	breaker = half_open_breaker()
+	_, sent = run(guard(sleeping, breaker, timeout = 0.05))
+	assert sent[0]["status"] == 503
+	assert not breaker.probing
+	assert breaker.allow()
+
+
+def test_probe_raising_a_non_database_error_frees_the_slot():
+	breaker = half_open_breaker()
+	with pytest.raises(AttributeError):
+		run(guard(raising(AttributeError("get")), breaker))
+	assert not breaker.probing
+	assert len(breaker.failures) == 1
+	assert breaker.allow()
+
+
+def test_database_errors_count_as_failures():
+	breaker = CircuitBreaker(threshold = 2, window = 60, cooldown = 60)
+	for _ in range(2):
+		with pytest.raises(ServerSelectionTimeoutError):
+			run(guard(raising(ServerSelectionTimeoutError("down")), breaker))
+	assert breaker.is_open
+
+
+def test_handler_503_counts_as_failure():
+	breaker = CircuitBreaker(threshold = 1, cooldown = 60)
+	run(guard(responding(503), breaker))
+	assert breaker.is_open
+
+
+def test_stream_outcome_is_recorded_when_the_response_starts():
+	breaker = half_open_breaker()
+	seen = {}
+
+	async def streaming():
+		seen["probing"] = breaker.probing
+		seen["allowed"] = breaker.allow()
+
+	run(guard(responding(then = streaming), breaker, timeout = None))
+	assert seen == {"probing": False, "allowed": True}
+
+
+def test_secondary_reads_pass_while_unreachable():
+	breaker = CircuitBreaker()
+	breaker.unreachable = True
+	_, sent = run(guard(responding(), breaker, secondary_reads = lambda scope: scope["path"] == "/card"))
+	assert sent[0]["status"] == 200
+	_, sent = run(guard(responding(), breaker, secondary_reads = lambda scope: False))
+	assert sent[0]["status"] == 503
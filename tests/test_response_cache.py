@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.responses import JSONResponse
+
+from response_cache import ResponseCache
+
+
+def cached_put(cache: ResponseCache, key: tuple, owners: tuple, body: dict | None = None, stamp: int | None = None):
+	cache.put(key, cache.stamp() if stamp is None else stamp, owners, JSONResponse(body or {"key": list(key)}))
+
+
+def test_hit_returns_the_stored_response():
+	cache = ResponseCache()
+	cached_put(cache, ("profile", "token"), ("owner",), {"name": "Jane"})
+	hit = cache.get(("profile", "token"))
+	assert hit.status_code == 200
+	assert hit.body == b'{"name":"Jane"}'
+	assert hit.media_type == "application/json"
+
+
+def test_bumping_an_owner_invalidates_only_its_entries():
+	cache = ResponseCache()
+	cached_put(cache, ("a",), ("alice",))
+	cached_put(cache, ("b",), ("bob",))
+	cached_put(cache, ("ab",), ("alice", "bob"))
+	cache.bump("alice")
+	assert cache.get(("a",)) is None
+	assert cache.get(("ab",)) is None
+	assert cache.get(("b",)) is not None
+
+
+def test_write_during_the_read_keeps_the_stale_result_out():
+	cache = ResponseCache()
+	# The stamp is taken before the database read; a write lands before the result is stored.
+	stamp = cache.stamp()
+	cache.bump("alice")
+	cached_put(cache, ("a",), ("alice",), stamp = stamp)
+	assert cache.get(("a",)) is None
+
+
+def test_unknown_owner_bump_clears_everything():
+	cache = ResponseCache()
+	cached_put(cache, ("a",), ("alice",))
+	cached_put(cache, ("b",), ("bob",))
+	cache.bump(None)
+	assert cache.get(("a",)) is None
+	assert cache.get(("b",)) is None
+	cached_put(cache, ("a",), ("alice",))
+	assert cache.get(("a",)) is not None
+
+
+def test_forgotten_owner_bumps_raise_the_floor():
+	cache = ResponseCache(max_owners = 1)
+	cached_put(cache, ("a",), ("alice",))
+	cache.bump("bob")
+	cache.bump("carol")
+	# bob's bump was forgotten, so anything stamped before it can no longer be trusted.
+	assert cache.get(("a",)) is None
+
+
+def test_none_owners_are_ignored():
+	cache = ResponseCache()
+	cached_put(cache, ("a",), ("alice", None))
+	cache.bump("bob")
+	assert cache.get(("a",)) is not None
+
+
+def test_entry_and_byte_limits_evict_least_recently_used():
+	cache = ResponseCache(max_entries = 2)
+	cached_put(cache, ("a",), ())
+	cached_put(cache, ("b",), ())
+	cache.get(("a",))
+	cached_put(cache, ("c",), ())
+	assert cache.get(("b",)) is None
+	assert cache.get(("a",)) is not None and cache.get(("c",)) is not None
+
+	cache = ResponseCache(max_bytes = 30)
+	cached_put(cache, ("a",), (), {"v": "x" * 10})
+	cached_put(cache, ("b",), (), {"v": "y" * 10})
+	assert cache.get(("a",)) is None
+	assert cache.get(("b",)) is not None
+	cached_put(cache, ("big",), (), {"v": "z" * 100})
+	assert cache.get(("big",)) is None
@@ -0,0 +1,20 @@
+from settings import Settings
+
+
+def test_defaults_need_no_arguments():
+	settings = Settings()
+	assert settings.tap_base_url is None
+	assert settings.blob_base_url is None
+
+
+def test_blob_uris_default_to_the_tap_origin():
+	assert Settings(tap_base_url = "https://uwitz.cards").blob_base_url == "https://uwitz.cards"
+	assert Settings(tap_base_url = "https://uwitz.cards", blob_base_url = "https://cdn.uwitz.cards").blob_base_url == "https://cdn.uwitz.cards"
+
+
+def test_from_env_reads_the_tap_origin(monkeypatch):
+	monkeypatch.setenv("TAP_BASE_URL", "https://uwitz.cards")
+	monkeypatch.delenv("BLOB_BASE_URL", raising = False)
+	settings = Settings.from_env()
+	assert settings.tap_base_url == "https://uwitz.cards"
+	assert settings.blob_base_url == "https://uwitz.cards"
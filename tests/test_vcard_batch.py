@@ -0,0 +1,17 @@
+from vcard_builder import build_from_row, normalize_vcard
+
+
+def test_roster_rows_without_fn_get_one_from_the_name():
+	content = build_from_row({"first_name": "Jane", "last_name": "Doe", "email": "jane@example.com"}).render()
+	assert "FN:Jane Doe" in normalize_vcard(content)
+
+
+def test_explicit_fn_wins():
+	content = build_from_row({"fn": "Dr. J. Doe", "first_name": "Jane", "last_name": "Doe"}).render()
+	assert content.count("FN:") == 1
+	assert "FN:Dr. J. Doe" in content
+
+
+def test_organisation_rows_fall_back_to_the_organisation_name():
+	content = build_from_row({"org": "Uwitz Sdn Bhd", "email": "hello@example.com"}).render()
+	assert "FN:Uwitz Sdn Bhd" in normalize_vcard(content)
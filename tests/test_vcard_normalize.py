@@ -0,0 +1,60 @@
+import pytest
+
+from vcard_builder import VCardError, normalize_vcard
+
+
+def rejection(text: str, **kwargs) -> tuple:
+	with pytest.raises(VCardError) as error:
+		normalize_vcard(text, **kwargs)
+	return error.value.code, error.value.detail
+
+
+def test_canonical_output():
+	text = "begin:vcard\nfn:Jane Doe\nitem1.email;type=work:jane@example.com\nversion:3.0\nend:vcard\n"
+	assert normalize_vcard(text) == (
+		"BEGIN:VCARD\r\n"
+		"VERSION:3.0\r\n"
+		"FN:Jane Doe\r\n"
+		"item1.EMAIL;type=work:jane@example.com\r\n"
+		"END:VCARD\r\n"
+	)
+
+
+def test_missing_version_defaults_to_4():
+	assert normalize_vcard("BEGIN:VCARD\r\nFN:x\r\nEND:VCARD\r\n").splitlines()[1] == "VERSION:4.0"
+
+
+def test_long_lines_are_folded_and_normalization_is_idempotent():
+	normalized = normalize_vcard("BEGIN:VCARD\r\nFN:x\r\nNOTE:" + "a" * 200 + "\r\nEND:VCARD\r\n")
+	assert all(len(line.encode()) <= 75 for line in normalized.split("\r\n"))
+	assert normalize_vcard(normalized) == normalized
+
+
+@pytest.mark.parametrize(
+	"text, code",
+	[
+		("", "invalid_format"),
+		("FN:x\r\nEND:VCARD\r\n", "invalid_format"),
+		("BEGIN:VCARD\r\nFN:x\r\n", "invalid_format"),
+		("BEGIN:VCARD\r\nFN:x\r\nEND:VCARD\r\nBEGIN:VCARD\r\nFN:y\r\nEND:VCARD\r\n", "invalid_format"),
+		("BEGIN:VCARD\r\nBEGIN:VCARD\r\nFN:x\r\nEND:VCARD\r\n", "invalid_format"),
+		("BEGIN:VCARD\r\nNOTE:no name\r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nFN: \r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nFN:x\r\nNOTE without colon\r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nFN:x\r\nBAD NAME:y\r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nFN:x\r\nTEL;BAD PARAM=1:y\r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nVERSION:5.0\r\nFN:x\r\nEND:VCARD\r\n", "invalid_property"),
+		("BEGIN:VCARD\r\nVERSION:4.0\r\nVERSION:3.0\r\nFN:x\r\nEND:VCARD\r\n", "invalid_property")
+	]
+)
+def test_rejections(text, code):
+	assert rejection(text)[0] == code
+
+
+def test_size_limits():
+	card = "BEGIN:VCARD\r\nFN:x\r\nEND:VCARD\r\n"
+	assert rejection(card, max_bytes = 10)[0] == "vcard_too_large"
+	# The limit is in UTF-8 bytes, not characters.
+	assert rejection(card.replace("x", "é" * 10), max_bytes = len(card) + 10)[0] == "vcard_too_large"
+	many = "BEGIN:VCARD\r\nFN:x\r\n" + "NOTE:n\r\n" * 5 + "END:VCARD\r\n"
+	assert rejection(many, max_properties = 3)[0] == "vcard_too_large"
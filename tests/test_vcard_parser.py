@@ -0,0 +1,106 @@
+from vcard_builder import iter_lines, iter_vcards, parse_property, transcode_vcard
+
+TWO_CARDS = (
+	"BEGIN:VCARD\r\n"
+	"VERSION:4.0\r\n"
+	"FN:Jane\r\n"
+	" Doe\r\n"
+	"NOTE:line one\\nline two\\, with comma\r\n"
+	"item1.ADR;TYPE=work;LABEL=\"Level 3; Tower A: Lobby\":;;1 Jalan Ampang;KL;;50450;MY\r\n"
+	"END:VCARD\r\n"
+	"BEGIN:VCARD\n"
+	"VERSION:3.0\n"
+	"FN:John Roe\n"
+	"TEL;WORK;VOICE:+60123456789\n"
+	"END:VCARD\n"
+)
+
+
+def test_iter_lines_unfolds_continuations():
+	lines = list(iter_lines("FN:Jane\r\n Doe\r\n\tSmith\r\nEND:VCARD\r\n"))
+	assert lines == ["FN:JaneDoeSmith", "END:VCARD"]
+
+
+def test_iter_lines_accepts_bytes_and_strips_the_bom():
+	assert list(iter_lines("\ufeffBEGIN:VCARD\nEND:VCARD\n".encode())) == ["BEGIN:VCARD", "END:VCARD"]
+
+
+def test_iter_vcards_yields_each_card():
+	cards = list(iter_vcards(TWO_CARDS))
+	assert len(cards) == 2
+	first = {prop.name: prop for prop in cards[0]}
+	assert first["FN"].text() == "JaneDoe"
+	assert first["NOTE"].text() == "line one\nline two, with comma"
+	assert [prop.text() for prop in cards[1] if prop.name == "FN"] == ["John Roe"]
+
+
+def test_quoted_parameters_keep_separators():
+	prop = parse_property('item1.ADR;TYPE=work;LABEL="Level 3; Tower A: Lobby":;;1 Jalan Ampang;KL;;50450;MY')
+	assert prop.group == "item1"
+	assert prop.name == "ADR"
+	assert prop.params == {"TYPE": "work", "LABEL": "Level 3; Tower A: Lobby"}
+	assert prop.components() == ["", "", "1 Jalan Ampang", "KL", "", "50450", "MY"]
+
+
+def test_bare_v21_parameters_become_types():
+	prop = parse_property("TEL;WORK;VOICE:+60123456789")
+	assert prop.params == {"TYPE": "WORK,VOICE"}
+
+
+def test_lines_outside_a_card_are_ignored():
+	assert list(iter_vcards("FN:stray\r\nBEGIN:VCARD\r\nFN:x\r\nEND:VCARD\r\nFN:after\r\n"))[0][0].value == "x"
+
+
+V4 = (
+	"BEGIN:VCARD\r\n"
+	"VERSION:4.0\r\n"
+	"FN:Jane Doe\r\n"
+	"N:Doe;Jane;;;\r\n"
+	"KIND:individual\r\n"
+	"TEL;TYPE=cell;PREF=1;VALUE=uri:tel:+60123456789\r\n"
+	"PHOTO:data:image/png;base64,iVBORw0KGgo=\r\n"
+	"END:VCARD\r\n"
+)
+
+
+def properties(text: str) -> dict:
+	return {prop.name: prop for prop in next(iter_vcards(text))}
+
+
+def test_v4_to_v3_converts_media_tel_and_pref():
+	v3 = properties(transcode_vcard(V4, "3.0"))
+	assert v3["VERSION"].value == "3.0"
+	assert "KIND" not in v3
+	assert v3["TEL"].value == "+60123456789"
+	assert v3["TEL"].params["TYPE"] == "cell,pref"
+	assert "PREF" not in v3["TEL"].params
+	assert v3["PHOTO"].params == {"ENCODING": "b", "TYPE": "PNG"}
+	assert v3["PHOTO"].value == "iVBORw0KGgo="
+
+
+def test_v4_round_trip_through_v3_keeps_the_content():
+	back = properties(transcode_vcard(transcode_vcard(V4, "3.0"), "4.0"))
+	original = properties(V4)
+	assert back["VERSION"].value == "4.0"
+	assert back["FN"].value == original["FN"].value
+	assert back["N"].value == original["N"].value
+	assert back["PHOTO"].value == original["PHOTO"].value
+	assert back["TEL"].params["PREF"] == "1"
+	assert back["TEL"].params["TYPE"] == "cell"
+
+
+def test_v3_round_trip_through_v4_keeps_the_content():
+	v3 = "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:John Roe\r\nN:Roe;John;;;\r\nTEL;TYPE=work,pref:+60123456789\r\nEND:VCARD\r\n"
+	back = properties(transcode_vcard(transcode_vcard(v3, "4.0"), "3.0"))
+	assert back["FN"].value == "John Roe"
+	assert back["TEL"].value == "+60123456789"
+	assert set(back["TEL"].params["TYPE"].split(",")) == {"work", "pref"}
+
+
+def test_v3_output_always_has_n():
+	assert "N:;;;;" in transcode_vcard("BEGIN:VCARD\r\nVERSION:4.0\r\nFN:x\r\nEND:VCARD\r\n", "3.0")
+
+
+def test_blob_references_pass_through_untouched():
+	line = "PHOTO;MEDIATYPE=image/jpeg:blob:sha256:" + "a" * 64
+	assert line in transcode_vcard(f"BEGIN:VCARD\r\nFN:x\r\n{line}\r\nEND:VCARD\r\n", "3.0").replace("\r\n ", "")
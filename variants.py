@@ -0,0 +1,26 @@
+from blobs import BLOB_SCHEME, resolve_media
+from compression import precompressed
+from vcard_builder import transcode_vcard
+
+VCARD_VARIANTS = {
+	"3.0": "v3",
+	"4.0": "v4"
+}
+
+
+def build_variants(content: str, blob_base_url: str | None = None) -> dict:
+	"""
+		Renders every stored variant of a card as ready-to-send UTF-8 bytes, plus pre-compressed copies.
+		With `blob_base_url` the blob URIs are baked in too. CPU-bound: callers in the API run it off the event loop.
+	"""
+	variants = {}
+	for version, key in VCARD_VARIANTS.items():
+		text = transcode_vcard(content, version)
+		if blob_base_url:
+			text = resolve_media(text, blob_base_url)
+		variants[key] = text.encode("utf-8")
+		# Blob references still resolved per request cannot be served from compressed bytes.
+		if BLOB_SCHEME not in text:
+			for encoding, data in precompressed(variants[key]).items():
+				variants[f"{key}_{encoding}"] = data
+	return variants
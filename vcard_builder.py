@@ -1,46 +1,463 @@
 #!/usr/bin/env python3
+import io
+import re
 import sys
 import datetime
 
+from collections import namedtuple
+
+VCARD4_ONLY = {"KIND", "GENDER", "LANG", "ANNIVERSARY", "CLIENTPIDMAP", "XML", "MEMBER"}
+VCARD3_ONLY = {"NAME", "MAILER", "LABEL", "CLASS", "PROFILE", "SORT-STRING", "AGENT"}
+VCARD4_ONLY_PARAMS = {"PID", "ALTID", "SORT-AS", "CALSCALE", "GEO", "TZ", "MEDIATYPE", "PREF", "LABEL"}
+MEDIA_VALUE_PROPERTIES = {"PHOTO", "LOGO", "SOUND", "KEY"}
+SUPPORTED_VERSIONS = ("2.1", "3.0", "4.0")
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9-]+")
+
 
 def clear_screen():
 	import os
 	os.system('clear' if os.name == 'posix' else 'cls')
 
 
+def format_params(params: dict) -> str:
+	return ";".join([f'{k}="{v}"' if (":" in v or ";" in v) and not v.startswith('"') else f"{k}={v}" for k, v in params.items()])
+
+
+class PropertyRecord:
+	__slots__ = ("name", "params", "value", "line")
+
+	def __init__(self, name: str, params: dict, value: str):
+		self.name = sys.intern(name)
+		self.params = params
+		self.value = value
+		self.line = None
+
+	def render(self) -> str:
+		if self.line is None:
+			param_str = format_params(self.params)
+			self.line = f"{self.name}{(';' + param_str) if param_str else ''}:{self.value}"
+		return self.line
+
+	def as_tuple(self) -> tuple:
+		return self.name, self.params, self.value
+
+
 class VCardBuilder:
 	def __init__(self):
-		self.props = []  # list of (name, params_dict, value)
-		self.version = "4.0"
+		self._records = {}  # key -> PropertyRecord, in insertion order
+		self._by_name = {}  # name -> {key: None}, in insertion order
+		self._next_key = 0
+		self._version = "4.0"
+		self._rendered = None
+
+	@property
+	def version(self) -> str:
+		return self._version
+
+	@version.setter
+	def version(self, version: str):
+		self._version = version
+		self._rendered = None
+
+	@property
+	def props(self) -> list:
+		return [record.as_tuple() for record in self._records.values()]
 
-	def add_property(self, name: str, value: str, params: dict | None = None):
+	@props.setter
+	def props(self, props: list):
+		self._records.clear()
+		self._by_name.clear()
+		self._rendered = None
+		for name, params, value in props:
+			self.add_property(name, value, params)
+
+	def __len__(self) -> int:
+		return len(self._records)
+
+	def add_property(self, name: str, value: str, params: dict | None = None) -> int | None:
 		name = name.strip().upper()
 		if not name:
+			return None
+		key = self._next_key
+		self._next_key += 1
+		self._records[key] = PropertyRecord(name, dict(params or {}), value)
+		self._by_name.setdefault(self._records[key].name, {})[key] = None
+		self._rendered = None
+		return key
+
+	def get(self, name: str) -> list:
+		return [self._records[key].as_tuple() for key in self._by_name.get(name.upper(), ())]
+
+	def first(self, name: str) -> str | None:
+		keys = self._by_name.get(name.upper())
+		return self._records[next(iter(keys))].value if keys else None
+
+	def set_property(self, name: str, value: str, params: dict | None = None) -> int | None:
+		keys = self._by_name.get(name.strip().upper())
+		if not keys:
+			return self.add_property(name, value, params)
+		key = next(iter(keys))
+		record = self._records[key]
+		record.value = value
+		if params is not None:
+			record.params = dict(params)
+		record.line = None
+		self._rendered = None
+		return key
+
+	def remove_key(self, key: int):
+		record = self._records.pop(key, None)
+		if record is None:
 			return
-		self.props.append((name, params or {}, value))
+		keys = self._by_name[record.name]
+		del keys[key]
+		if not keys:
+			del self._by_name[record.name]
+		self._rendered = None
+
+	def remove_properties(self, name: str):
+		for key in tuple(self._by_name.get(name.upper(), ())):
+			self.remove_key(key)
+
+	def _key_at(self, index: int) -> int | None:
+		if 0 <= index < len(self._records):
+			for i, key in enumerate(self._records):
+				if i == index:
+					return key
+		return None
 
 	def remove_property(self, index: int):
-		if 0 <= index < len(self.props):
-			self.props.pop(index)
+		key = self._key_at(index)
+		if key is not None:
+			self.remove_key(key)
+
+	def replace_property(self, index: int, name: str, value: str, params: dict | None = None):
+		key = self._key_at(index)
+		if key is None:
+			return
+		name = name.strip().upper() or self._records[key].name
+		old = self._records[key]
+		if old.name != name:
+			del self._by_name[old.name][key]
+			if not self._by_name[old.name]:
+				del self._by_name[old.name]
+			# Keys grow with insertion, so sorting keeps the per-name index in card order.
+			self._by_name[name] = dict.fromkeys(sorted(list(self._by_name.get(name, ())) + [key]))
+		self._records[key] = PropertyRecord(name, dict(params if params is not None else old.params), value)
+		self._rendered = None
 
 	def list_properties(self):
-		if not self.props:
+		if not self._records:
 			print("(no properties yet)")
 			return
-		for i, (name, params, value) in enumerate(self.props):
-			param_str = ";".join([f"{k}={v}" for k, v in params.items()])
-			print(f"{i+1}. {name}{(';' + param_str) if param_str else ''}:{value}")
+		for i, record in enumerate(self._records.values()):
+			print(f"{i+1}. {record.render()}")
 
 	def render(self) -> str:
-		lines = [
-			"BEGIN:VCARD",
-			f"VERSION:{self.version}"
-		]
-		for name, params, value in self.props:
-			param_str = ";".join([f"{k}={v}" for k, v in params.items()])
-			lines.append(f"{name}{(';' + param_str) if param_str else ''}:{value}")
-		lines.append("END:VCARD")
-		return "\n".join(lines)
+		if self._rendered is None:
+			lines = [
+				"BEGIN:VCARD",
+				f"VERSION:{self._version}"
+			]
+			lines.extend(record.render() for record in self._records.values())
+			lines.append("END:VCARD")
+			self._rendered = "\n".join(lines)
+		return self._rendered
+
+
+def _raw_lines(source):
+	if isinstance(source, str):
+		return io.StringIO(source)
+	if isinstance(source, (bytes, bytearray)):
+		return io.BytesIO(source)
+	return source
+
+
+def iter_lines(source):
+	"""Yields unfolded content lines from a str, bytes, text/binary file or iterable of lines."""
+	pending = []
+	for raw in _raw_lines(source):
+		if isinstance(raw, (bytes, bytearray)):
+			raw = raw.decode("utf-8", errors = "replace")
+		raw = raw.rstrip("\r\n")
+		if raw[:1] in (" ", "\t") and pending:
+			pending.append(raw[1:])
+			continue
+		if pending:
+			yield "".join(pending)
+		pending = [raw.lstrip("\ufeff")] if raw.strip() else []
+	if pending:
+		yield "".join(pending)
+
+
+def unescape_value(value: str) -> str:
+	if "\\" not in value:
+		return value
+	out = []
+	chars = iter(value)
+	for ch in chars:
+		if ch == "\\":
+			nxt = next(chars, "")
+			out.append("\n" if nxt in ("n", "N") else nxt)
+		else:
+			out.append(ch)
+	return "".join(out)
+
+
+def split_escaped(value: str, separator: str) -> list:
+	parts = []
+	current = []
+	escaped = False
+	for ch in value:
+		if escaped:
+			current.append("\\" + ch)
+			escaped = False
+		elif ch == "\\":
+			escaped = True
+		elif ch == separator:
+			parts.append("".join(current))
+			current = []
+		else:
+			current.append(ch)
+	parts.append("".join(current))
+	return parts
+
+
+class VCardProperty(namedtuple("VCardProperty", "group name params value")):
+	__slots__ = ()
+
+	def text(self) -> str:
+		return unescape_value(self.value)
+
+	def components(self, separator: str = ";") -> list:
+		return [unescape_value(part) for part in split_escaped(self.value, separator)]
+
+
+def parse_property(line: str) -> VCardProperty | None:
+	head_value = split_unquoted(line, ":", 1)
+	if len(head_value) != 2:
+		return None
+	head, value = head_value
+	head_parts = split_unquoted(head, ";")
+	group, _, name = head_parts[0].strip().rpartition(".")
+	name = name.upper()
+	if not name:
+		return None
+	params = {}
+	for part in head_parts[1:]:
+		key, sep, param_value = part.partition("=")
+		key = key.strip().upper()
+		if not sep:
+			# vCard 2.1 bare parameters such as TEL;WORK;VOICE are TYPE values.
+			key, param_value = "TYPE", key
+		param_value = param_value.strip().strip('"')
+		params[key] = f"{params[key]},{param_value}" if params.get(key) else param_value
+	return VCardProperty(sys.intern(group) if group else None, sys.intern(name), params, value)
+
+
+def iter_vcards(source):
+	"""Yields the properties of each vCard in `source` as a list, holding one card in memory at a time."""
+	card = None
+	for line in iter_lines(source):
+		upper = line.strip().upper()
+		if upper == "BEGIN:VCARD":
+			card = []
+		elif upper == "END:VCARD":
+			if card is not None:
+				yield card
+			card = None
+		elif card is not None:
+			prop = parse_property(line)
+			if prop:
+				card.append(prop)
+
+
+def split_unquoted(text: str, separator: str, limit: int = -1) -> list:
+	if '"' not in text:
+		return text.split(separator, limit)
+	parts = []
+	start = 0
+	in_quotes = False
+	for i, ch in enumerate(text):
+		if ch == '"':
+			in_quotes = not in_quotes
+		elif ch == separator and not in_quotes:
+			parts.append(text[start:i])
+			start = i + 1
+			limit -= 1
+			if limit == 0:
+				break
+	parts.append(text[start:])
+	return parts
+
+
+def fold_line(line: str, limit: int = 75) -> str:
+	if len(line) <= limit and line.isascii():
+		return line
+	if line.isascii():
+		return "\r\n ".join([line[:limit]] + [line[i:i + limit - 1] for i in range(limit, len(line), limit - 1)])
+	encoded = line.encode("utf-8")
+	if len(encoded) <= limit:
+		return line
+	chunks = []
+	current = ""
+	size = 0
+	for ch in line:
+		width = len(ch.encode("utf-8"))
+		if size + width > limit:
+			chunks.append(current)
+			current = " "
+			size = 1
+		current += ch
+		size += width
+	chunks.append(current)
+	return "\r\n".join(chunks)
+
+
+def render_property(name: str, params: list, value: str) -> str:
+	param_str = ";".join([f"{k}={v}" if v else k for k, v in params])
+	return f"{name}{(';' + param_str) if param_str else ''}:{value}"
+
+
+def _type_values(params: list) -> list:
+	return [t.strip().strip('"') for k, v in params if k == "TYPE" for t in v.split(",") if t.strip()]
+
+
+def _params_to_v3(name: str, params: list, value: str) -> tuple:
+	converted = [(k, v) for k, v in params if k not in VCARD4_ONLY_PARAMS and k != "VALUE"]
+	if any(k == "PREF" for k, _ in params):
+		converted.append(("TYPE", "pref"))
+	if name in MEDIA_VALUE_PROPERTIES and value[:5].lower() == "data:" and "," in value:
+		header, payload = value[5:].split(",", 1)
+		if header.lower().endswith(";base64"):
+			converted += [("ENCODING", "b"), ("TYPE", header[:-7].split("/")[-1].upper())]
+			return converted, payload
+	if name == "TEL" and value[:4].lower() == "tel:":
+		return converted, value[4:]
+	if any(k == "VALUE" for k, _ in params) or (name in MEDIA_VALUE_PROPERTIES and "://" in value):
+		converted.append(("VALUE", "uri"))
+	return converted, value
+
+
+def _params_to_v4(name: str, params: list, value: str) -> tuple:
+	types = _type_values(params)
+	converted = [(k, v) for k, v in params if k not in ("CHARSET", "ENCODING", "TYPE")]
+	encoding = next((v.upper() for k, v in params if k == "ENCODING"), None)
+	if name in MEDIA_VALUE_PROPERTIES and encoding in ("B", "BASE64"):
+		fmt = next((t for t in types if t.lower() not in ("work", "home", "pref")), "octet-stream")
+		kind = {"PHOTO": "image", "LOGO": "image", "SOUND": "audio"}.get(name, "application")
+		types = [t for t in types if t != fmt]
+		value = f"data:{kind}/{fmt.lower()};base64,{value}"
+	elif encoding:
+		converted.append(("ENCODING", encoding))
+	if "pref" in [t.lower() for t in types]:
+		converted.append(("PREF", "1"))
+		types = [t for t in types if t.lower() != "pref"]
+	if types:
+		converted.append(("TYPE", ",".join(types)))
+	return converted, value
+
+
+def transcode_vcard(text: str, version: str) -> str:
+	"""Rewrites a single vCard as `version` ("3.0" or "4.0") with CRLF line endings and folded lines."""
+	lines = []
+	has_n = False
+	for line in iter_lines(text):
+		upper = line.strip().upper()
+		if upper in ("BEGIN:VCARD", "END:VCARD"):
+			if upper == "END:VCARD" and version == "3.0" and not has_n:
+				lines.append("N:;;;;")
+			lines.append(upper)
+			if upper == "BEGIN:VCARD":
+				lines.append(f"VERSION:{version}")
+			continue
+		head_value = split_unquoted(line, ":", 1)
+		if len(head_value) != 2:
+			continue
+		head, value = head_value
+		head_parts = split_unquoted(head, ";")
+		name = head_parts[0]
+		bare = name.rsplit(".", 1)[-1].upper()
+		if bare == "VERSION" or (version == "3.0" and bare in VCARD4_ONLY) or (version == "4.0" and bare in VCARD3_ONLY):
+			continue
+		if bare == "N":
+			has_n = True
+		if value.startswith("blob:"):
+			# Blob references are rendered per version when they are resolved.
+			lines.append(line)
+			continue
+		params = []
+		for part in head_parts[1:]:
+			key, _, param_value = part.partition("=")
+			params.append((key.strip().upper(), param_value.strip()))
+		if version == "3.0":
+			params, value = _params_to_v3(bare, params, value)
+		else:
+			params, value = _params_to_v4(bare, params, value)
+		lines.append(render_property(name, params, value))
+	return "\r\n".join(fold_line(line) for line in lines) + "\r\n"
+
+
+class VCardError(ValueError):
+	def __init__(self, code: str, detail: str):
+		super().__init__(detail)
+		self.code = code
+		self.detail = detail
+
+
+def normalize_vcard(text: str, max_bytes: int = 1048576, max_properties: int = 1000) -> str:
+	"""
+		Validates a single vCard in one pass and returns its canonical form: VERSION right after
+		BEGIN, upper-case property names, 75-octet folding and CRLF line endings.
+	"""
+	if not text or len(text) > max_bytes or len(text.encode("utf-8")) > max_bytes:
+		raise VCardError("vcard_too_large" if text else "invalid_format", f"vCard must be between 1 and {max_bytes} bytes")
+	lines = []
+	version = None
+	has_fn = False
+	state = "before"
+	for line in iter_lines(text):
+		upper = line.strip().upper()
+		if state == "before":
+			if upper != "BEGIN:VCARD":
+				raise VCardError("invalid_format", "vCard must start with BEGIN:VCARD")
+			state = "inside"
+			continue
+		if state == "after":
+			raise VCardError("invalid_format", "only one vCard is allowed")
+		if upper == "END:VCARD":
+			state = "after"
+			continue
+		if upper == "BEGIN:VCARD":
+			raise VCardError("invalid_format", "nested vCards are not allowed")
+		head_value = split_unquoted(line, ":", 1)
+		if len(head_value) != 2:
+			raise VCardError("invalid_property", f"missing ':' in {line[:40]!r}")
+		head, value = head_value
+		head_parts = split_unquoted(head, ";")
+		group, _, name = head_parts[0].strip().rpartition(".")
+		if not TOKEN_PATTERN.fullmatch(name) or (group and not TOKEN_PATTERN.fullmatch(group)):
+			raise VCardError("invalid_property", f"invalid property name {head_parts[0][:40]!r}")
+		for part in head_parts[1:]:
+			if not TOKEN_PATTERN.fullmatch(part.partition("=")[0].strip()):
+				raise VCardError("invalid_property", f"invalid parameter {part[:40]!r} on {name.upper()}")
+		name = name.upper()
+		if name == "VERSION":
+			if version is not None or value.strip() not in SUPPORTED_VERSIONS:
+				raise VCardError("invalid_property", "VERSION must appear once and be 2.1, 3.0 or 4.0")
+			version = value.strip()
+			continue
+		if name == "FN" and value.strip():
+			has_fn = True
+		if len(lines) >= max_properties:
+			raise VCardError("vcard_too_large", f"vCard has more than {max_properties} properties")
+		head_parts[0] = f"{group}.{name}" if group else name
+		lines.append(fold_line(";".join(head_parts) + ":" + value))
+	if state != "after":
+		raise VCardError("invalid_format", "vCard must end with END:VCARD")
+	if not has_fn:
+		raise VCardError("invalid_property", "FN is required")
+	return "\r\n".join(["BEGIN:VCARD", f"VERSION:{version or '4.0'}"] + lines + ["END:VCARD"]) + "\r\n"
 
 
 def input_nonempty(prompt: str) -> str:
@@ -183,31 +600,14 @@ def paste_from_clipboard() -> str | None:
 
 
 def parse_vcard_into_builder(vb: VCardBuilder, text: str):
-	lines = [l.strip() for l in text.splitlines() if l.strip()]
-	in_vcard = False
 	props = []
-	for line in lines:
-		if line.upper() == 'BEGIN:VCARD':
-			in_vcard = True
-			continue
-		if line.upper() == 'END:VCARD':
-			break
-		if not in_vcard:
-			continue
-		# Split into name(;params...):value
-		if ':' not in line:
-			continue
-		head, value = line.split(':', 1)
-		parts = head.split(';')
-		name = parts[0].upper().strip()
-		params = {}
-		for p in parts[1:]:
-			if '=' in p:
-				k, v = p.split('=', 1)
-				params[k.strip().upper()] = v.strip()
-			else:
-				params[p.strip().upper()] = ''
-		props.append((name, params, value))
+	for card in iter_vcards(text):
+		for prop in card:
+			if prop.name == "VERSION":
+				vb.version = prop.value.strip() or vb.version
+				continue
+			props.append((f"{prop.group.upper()}.{prop.name}" if prop.group else prop.name, prop.params, prop.value))
+		break
 	# Replace builder props
 	vb.props = props
 
@@ -229,7 +629,7 @@ def edit_properties(vb: VCardBuilder):
 			idx_str = cmd[2:].strip()
 			if idx_str.isdigit():
 				i = int(idx_str) - 1
-				if 0 <= i < len(vb.props):
+				if 0 <= i < len(vb):
 					name, params, value = vb.props[i]
 					new_name = input(f"Name [{name}]: ").strip() or name
 					print("Enter params key=value, blank to stop. Current:", ";".join([f"{k}={v}" for k, v in params.items()]))
@@ -244,7 +644,7 @@ def edit_properties(vb: VCardBuilder):
 						else:
 							print("Invalid param; use key=value")
 					new_value = input(f"Value [{value}]: ").strip() or value
-					vb.props[i] = (new_name.upper(), new_params, new_value)
+					vb.replace_property(i, new_name, new_value, new_params)
 				else:
 					print("Invalid index")
 			else:
@@ -261,6 +661,203 @@ def edit_properties(vb: VCardBuilder):
 			input("Press Enter...")
 
 
+ROW_FIELDS = {
+	"fn": "FN",
+	"full_name": "FN",
+	"org": "ORG",
+	"organisation": "ORG",
+	"title": "TITLE",
+	"note": "NOTE"
+}
+ROW_CONTACTS = {
+	"email": ("EMAIL", "work"),
+	"phone": ("TEL", "cell,voice"),
+	"url": ("URL", "home"),
+	"address": ("ADR", "home")
+}
+ROW_NAME_PARTS = (
+	("surname", "last_name"),
+	("given", "first_name"),
+	("additional",),
+	("prefixes",),
+	("suffixes",)
+)
+ROW_META = ("owner_id", "tier", "status", "payment_id")
+
+
+def build_from_row(row: dict) -> VCardBuilder:
+	"""Maps a CSV/JSONL row onto a builder, mirroring the interactive standard fields."""
+	vb = VCardBuilder()
+	row = {str(k).strip(): str(v).strip() for k, v in row.items() if k and v is not None and str(v).strip()}
+	lowered = {k.lower(): v for k, v in row.items()}
+	added = set()
+	for column, name in ROW_FIELDS.items():
+		if lowered.get(column) and name not in added:
+			vb.add_property(name, lowered[column])
+			added.add(name)
+	parts = [next((lowered[alias] for alias in aliases if lowered.get(alias)), "") for aliases in ROW_NAME_PARTS]
+	if any(parts):
+		vb.add_property("N", ";".join(parts))
+	if "FN" not in added:
+		# FN is required; rosters usually only carry first and last names.
+		surname, given, additional, prefixes, suffixes = parts
+		full_name = " ".join(part for part in (prefixes, given, additional, surname, suffixes) if part) or lowered.get("org") or lowered.get("organisation")
+		if full_name:
+			vb.add_property("FN", full_name)
+	for column, (name, type_hint) in ROW_CONTACTS.items():
+		if lowered.get(column):
+			vb.add_property(name, lowered[column], {"TYPE": type_hint})
+	if lowered.get("bday"):
+		vb.add_property("BDAY", lowered["bday"].replace("-", ""))
+	for column, value in row.items():
+		# Upper-case columns are raw property heads, e.g. "X-SOCIALPROFILE;TYPE=github".
+		if column.isupper() or column.startswith("X-"):
+			prop = parse_property(f"{column}:{value}")
+			if prop:
+				vb.add_property(f"{prop.group}.{prop.name}" if prop.group else prop.name, prop.value, prop.params)
+	return vb
+
+
+def render_row(row: dict) -> dict:
+	meta = {key: row.get(key) for key in ROW_META if row.get(key)}
+	meta["content"] = build_from_row({k: v for k, v in row.items() if k not in ROW_META}).render()
+	return meta
+
+
+def iter_rows(path: str):
+	import csv, json
+	with open(path, newline = "", encoding = "utf-8-sig") as f:
+		if path.lower().endswith((".jsonl", ".ndjson")):
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
+		else:
+			yield from csv.DictReader(f)
+
+
+def iter_rendered(rows, workers: int, window: int = 10000):
+	if workers <= 1:
+		for row in rows:
+			yield render_row(row)
+		return
+	from itertools import islice
+	from concurrent.futures import ProcessPoolExecutor
+	with ProcessPoolExecutor(max_workers = workers) as pool:
+		while chunk := list(islice(rows, window)):
+			yield from pool.map(render_row, chunk, chunksize = 256)
+
+
+def post_card(url: str, token: str, payload: dict, timeout: float) -> tuple:
+	import json, urllib.request, urllib.error
+	request = urllib.request.Request(
+		url,
+		data = json.dumps(payload).encode(),
+		headers = {"Content-Type": "application/json", "Authorization": token},
+		method = "POST"
+	)
+	try:
+		with urllib.request.urlopen(request, timeout = timeout) as response:
+			return response.status, json.loads(response.read() or b"{}")
+	except urllib.error.HTTPError as e:
+		return e.code, {"error": e.read().decode("utf-8", errors = "replace")}
+	except (urllib.error.URLError, TimeoutError) as e:
+		return 0, {"error": str(e)}
+	except Exception as e:
+		# Dropped connections, truncated bodies and non-JSON 2xx replies all count as failed rows.
+		return 0, {"error": repr(e)}
+
+
+async def push_cards(cards, url: str, token: str, concurrency: int, timeout: float) -> tuple:
+	"""POSTs (index, card) pairs as they are produced, returning (count, [(index, status, body), ...] for failed rows)."""
+	import asyncio
+	from concurrent.futures import ThreadPoolExecutor
+	loop = asyncio.get_running_loop()
+	limit = asyncio.Semaphore(concurrency)
+	failed = []
+	count = 0
+	with ThreadPoolExecutor(max_workers = concurrency) as pool:
+		async def push(index: int, card: dict):
+			async with limit:
+				try:
+					status, body = await loop.run_in_executor(pool, post_card, url, token, {"type": "vcard", **card}, timeout)
+				except Exception as e:
+					status, body = 0, {"error": repr(e)}
+				if not 200 <= status < 300:
+					failed.append((index, status, body))
+
+		pending = set()
+		for index, card in cards:
+			count += 1
+			# Never hold more than a few windows of requests in flight.
+			if len(pending) >= concurrency * 4:
+				_, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+			pending.add(asyncio.ensure_future(push(index, card)))
+		if pending:
+			await asyncio.wait(pending)
+	return count, sorted(failed, key = lambda result: result[0])
+
+
+def batch_main(argv: list) -> int:
+	import os, json, asyncio, argparse
+	parser = argparse.ArgumentParser(prog = "vcard_builder.py batch", description = "Render vCards in bulk from CSV or JSONL rows.")
+	parser.add_argument("input", help = "CSV with a header row, or JSONL/NDJSON with one object per line")
+	parser.add_argument("--vcf", help = "write all cards to one .vcf file")
+	parser.add_argument("--ndjson", help = "write one {owner_id, content, ...} object per line")
+	parser.add_argument("--push", metavar = "URL", help = "POST each card to the API, e.g. https://host/create/card")
+	parser.add_argument("--token", default = os.getenv("CARDAPI_TOKEN"), help = "admin token for --push (or CARDAPI_TOKEN)")
+	parser.add_argument("--owner-id", help = "owner_id for rows that do not carry one")
+	parser.add_argument("--concurrency", type = int, default = 16)
+	parser.add_argument("--timeout", type = float, default = 30.0)
+	parser.add_argument("--workers", type = int, default = 1, help = "render in a process pool of this size (0 = CPU count)")
+	args = parser.parse_args(argv)
+	if not (args.vcf or args.ndjson or args.push):
+		parser.error("choose at least one of --vcf, --ndjson or --push")
+	if args.push and not args.token:
+		parser.error("--push needs --token or CARDAPI_TOKEN")
+
+	workers = args.workers or os.cpu_count() or 1
+	vcf = open(args.vcf, "w", encoding = "utf-8", newline = "") if args.vcf else None
+	ndjson = open(args.ndjson, "w", encoding = "utf-8") if args.ndjson else None
+
+	rejected = []
+
+	def cards():
+		# Written and pushed as they are rendered, so large inputs are never held in memory.
+		for index, card in enumerate(iter_rendered(iter_rows(args.input), workers)):
+			if args.owner_id and not card.get("owner_id"):
+				card["owner_id"] = args.owner_id
+			if vcf:
+				vcf.write(card["content"].replace("\n", "\r\n") + "\r\n")
+			if ndjson:
+				ndjson.write(json.dumps(card) + "\n")
+			if args.push:
+				# Rows the API would refuse are reported here instead of costing a round-trip.
+				try:
+					normalize_vcard(card["content"], max_bytes = len(card["content"].encode("utf-8")) + 1)
+				except VCardError as e:
+					rejected.append((index, None, {"error": e.code, "detail": e.detail}))
+					continue
+			yield index, card
+
+	try:
+		if not args.push:
+			for _ in cards():
+				pass
+			print(f"✅ Rendered cards from {args.input}")
+			return 0
+		count, failed = asyncio.run(push_cards(cards(), args.push, args.token, args.concurrency, args.timeout))
+	finally:
+		for f in (vcf, ndjson):
+			if f:
+				f.close()
+	count += len(rejected)
+	failed = sorted(failed + rejected, key = lambda result: result[0])
+	for index, status, body in failed:
+		print(f"❌ Row {index + 1}: {'invalid' if status is None else f'HTTP {status}'} {body}", file = sys.stderr)
+	print(f"{'❌' if failed else '✅'} Pushed {count - len(failed)}/{count} cards")
+	return 1 if failed else 0
+
+
 def main():
 	vb = VCardBuilder()
 	while True:
@@ -358,6 +955,8 @@ def main():
 
 
 if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == "batch":
+		sys.exit(batch_main(sys.argv[2:]))
 	try:
 		main()
 	except KeyboardInterrupt: